@@ -1,8 +1,9 @@
 import asyncio
+import os
 import time
 import uuid
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 from selenium import webdriver
 from selenium.webdriver.firefox.options import Options as FirefoxOptions
 from selenium.webdriver.firefox.service import Service as FirefoxService
@@ -11,24 +12,100 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 import logging
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from database import get_db, Site, Log, get_setting, update_setting
+from database import AsyncSessionLocal, Site, VisitMetric
 from models import LogCreate, LogLevel
+from log_sink import LogSink
+from loop_bridge import LoopBridge
+from browser_pool import BrowserPool
+from scheduler import SiteScheduler
+from site_stats import SiteStatsAggregator
+from click_counter import ClickCounter
+from status_cache import StatusCache
+from settings_cache import settings
 import json
 from concurrent.futures import ThreadPoolExecutor
 import threading
 
 logger = logging.getLogger(__name__)
 
+# Navigation and Paint Timing of the current page, in ms from navigation start
+NAVIGATION_TIMING_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+if (!nav) {
+    return null;
+}
+const fcp = performance.getEntriesByName('first-contentful-paint')[0];
+return {
+    dns_ms: nav.domainLookupEnd - nav.domainLookupStart,
+    connect_ms: nav.connectEnd - nav.connectStart,
+    ttfb_ms: nav.responseStart - nav.startTime,
+    dom_content_loaded_ms: nav.domContentLoadedEventEnd - nav.startTime,
+    load_event_ms: nav.loadEventEnd > 0 ? nav.loadEventEnd - nav.startTime : null,
+    first_contentful_paint_ms: fcp ? fcp.startTime : null,
+    transfer_size: nav.transferSize
+};
+"""
+
+class SiteJob:
+    """Snapshot of the site fields a visit needs, safe to share with worker threads"""
+    def __init__(self, id: str, name: str, url: str, duration: int, interval: int):
+        self.id = id
+        self.name = name
+        self.url = url
+        self.duration = duration
+        self.interval = interval
+    
+    @classmethod
+    def from_site(cls, site: Site) -> "SiteJob":
+        return cls(site.id, site.name, site.url, site.duration, site.interval)
+    
+    @classmethod
+    def from_payload(cls, payload: dict) -> "SiteJob":
+        return cls(payload["id"], payload["name"], payload["url"], payload["duration"], payload["interval"])
+
 class AutomationEngine:
-    def __init__(self, websocket_manager=None):
+    def __init__(self, websocket_manager=None, event_bus=None):
         self.is_running = False
         self.is_paused = False
+        # With several workers only the leader runs sites, the others mirror its state
+        self.is_leader = True
+        self.leader_state = {"is_running": False, "is_paused": False}
+        # ClusterNode when this engine runs as one of several engine nodes
+        self.cluster = None
         self.websocket_manager = websocket_manager
         self.active_browsers: Dict[str, webdriver.Firefox] = {}
-        self.executor = ThreadPoolExecutor(max_workers=10)
-        self.site_threads: Dict[str, threading.Thread] = {}
-        self.stop_events: Dict[str, threading.Event] = {}
+        self.log_sink = LogSink()
+        self.loop_bridge = LoopBridge()
+        self.browser_pool = BrowserPool(
+            self.create_browser,
+            size=int(os.environ.get('BROWSER_POOL_SIZE', '4')),
+            max_page_loads=int(os.environ.get('BROWSER_MAX_PAGE_LOADS', '200')),
+            max_rss_mb=float(os.environ.get('BROWSER_MAX_RSS_MB', '1024'))
+        )
+        # One worker per pooled browser, due visits beyond that wait in the scheduler
+        self.executor = ThreadPoolExecutor(max_workers=self.browser_pool.size, thread_name_prefix="site-visit")
+        self.scheduler = SiteScheduler(self.executor, self.browser_pool.size, self.run_scheduled_visit)
+        self.sites: Dict[str, SiteJob] = {}
+        self.site_stats = SiteStatsAggregator()
+        self.click_counter = ClickCounter(flush_interval=float(os.environ.get('CLICK_FLUSH_INTERVAL', '2')))
+        self.status_cache = StatusCache(
+            self.click_counter,
+            self.loop_bridge,
+            on_change=self.broadcast_status,
+            ttl=float(os.environ.get('STATUS_CACHE_TTL', '5'))
+        )
+        self.global_interval = 10
+        self.stop_event = threading.Event()
+        
+        # Apply site CRUD changes to the running engine
+        if event_bus:
+            for topic in ("site.created", "site.updated", "site.toggled", "site.deleted", "sites.imported"):
+                event_bus.subscribe(topic, self.on_site_event)
+                event_bus.subscribe(topic, self.status_cache.on_site_event)
+            event_bus.subscribe("setting.changed", self.on_setting_changed)
+            event_bus.subscribe("setting.changed", self.status_cache.on_setting_changed)
         
     def create_browser(self) -> webdriver.Firefox:
         """Create a Firefox browser instance"""
@@ -62,173 +139,320 @@ class AutomationEngine:
     async def log_event(self, level: LogLevel, action: str, message: str, site_name: str = None, duration: float = None):
         """Log an event to database and websocket"""
         try:
-            db = next(get_db())
-            log_entry = Log(
-                id=str(uuid.uuid4()),
-                level=level.value,
-                action=action,
-                site_name=site_name,
-                message=message,
-                duration=duration,
-                timestamp=datetime.now(timezone.utc),
-                created_at=datetime.now(timezone.utc)
-            )
-            db.add(log_entry)
-            db.commit()
+            now = datetime.now(timezone.utc)
+            log_entry = {
+                "id": str(uuid.uuid4()),
+                "level": level.value,
+                "action": action,
+                "site_name": site_name,
+                "message": message,
+                "duration": duration,
+                "timestamp": now,
+                "created_at": now
+            }
+            # Rows are written in batches by the log sink
+            self.log_sink.submit(log_entry)
             
             # Send to websocket if available
             if self.websocket_manager:
                 await self.websocket_manager.broadcast({
                     "type": "log",
                     "data": {
-                        "id": log_entry.id,
-                        "timestamp": log_entry.timestamp.isoformat(),
-                        "level": log_entry.level,
-                        "action": log_entry.action,
-                        "site_name": log_entry.site_name,
-                        "message": log_entry.message,
-                        "duration": log_entry.duration
+                        "id": log_entry["id"],
+                        "timestamp": log_entry["timestamp"].isoformat(),
+                        "level": log_entry["level"],
+                        "action": log_entry["action"],
+                        "site_name": log_entry["site_name"],
+                        "message": log_entry["message"],
+                        "duration": log_entry["duration"]
                     }
                 })
         except Exception as e:
             logger.error(f"Failed to log event: {e}")
-        finally:
-            db.close()
     
-    async def process_site(self, site: Site, global_interval: int):
-        """Process a single site in a separate thread"""
+    def log_from_thread(self, level: LogLevel, action: str, message: str, site_name: str = None, duration: float = None):
+        """Log an event from a site worker thread through the server event loop"""
+        self.loop_bridge.submit(self.log_event(level, action, message, site_name, duration))
+    
+    def collect_visit_metrics(self, browser: webdriver.Firefox) -> dict:
+        """Read the browser's Navigation and Paint Timing for the loaded page"""
+        try:
+            timing = browser.execute_script(NAVIGATION_TIMING_SCRIPT)
+        except WebDriverException as e:
+            logger.warning(f"Failed to read navigation timing: {e}")
+            return {}
+        
+        if not timing:
+            return {}
+        return {
+            key: int(round(value)) if value is not None and value >= 0 else None
+            for key, value in timing.items()
+        }
+    
+    def record_visit(self, site_id: str, timestamp: datetime, success: bool, load_time: float = None, timing: dict = None):
+        """Queue a visit_metrics row for the batched writer"""
+        row = {
+            "site_id": site_id,
+            "timestamp": timestamp,
+            "success": success,
+            "load_time_ms": int(round(load_time * 1000)) if load_time is not None else None,
+            "dns_ms": None,
+            "connect_ms": None,
+            "ttfb_ms": None,
+            "dom_content_loaded_ms": None,
+            "load_event_ms": None,
+            "first_contentful_paint_ms": None,
+            "transfer_size": None
+        }
+        if timing:
+            row.update({key: value for key, value in timing.items() if key in row})
+        self.log_sink.submit(row, VisitMetric)
+        self.site_stats.record(site_id, timestamp, success, row["load_time_ms"])
+    
+    def visit_site(self, site: SiteJob):
+        """Load a site in a pooled browser and keep it open for the configured duration"""
         site_id = site.id
-        stop_event = threading.Event()
-        self.stop_events[site_id] = stop_event
         
-        def run_site_loop():
-            browser = None
+        # Wait for a free browser, giving up if the site is stopped meanwhile
+        pooled = None
+        while pooled is None:
+            if self.stop_event.is_set() or not self.scheduler.is_scheduled(site_id):
+                return
             try:
-                browser = self.create_browser()
-                self.active_browsers[site_id] = browser
-                
-                while not stop_event.is_set() and self.is_running:
-                    if self.is_paused:
-                        time.sleep(1)
-                        continue
-                    
-                    start_time = time.time()
-                    
-                    try:
-                        # Log site opening
-                        asyncio.run(self.log_event(
-                            LogLevel.info,
-                            "Site Opening",
-                            f"Opening {site.name}",
-                            site.name
-                        ))
-                        
-                        # Navigate to the site
-                        browser.get(site.url)
-                        
-                        # Wait for page to load
-                        WebDriverWait(browser, 10).until(
-                            lambda driver: driver.execute_script("return document.readyState") == "complete"
-                        )
-                        
-                        # Log successful load
-                        load_time = time.time() - start_time
-                        asyncio.run(self.log_event(
-                            LogLevel.success,
-                            "Site Loaded",
-                            f"Successfully loaded {site.name}",
-                            site.name,
-                            load_time
-                        ))
-                        
-                        # Wait for the configured duration
-                        time.sleep(site.duration)
-                        
-                        # Update site statistics
-                        db = next(get_db())
-                        try:
-                            db_site = db.query(Site).filter(Site.id == site_id).first()
-                            if db_site:
-                                db_site.clicks += 1
-                                db_site.last_access = datetime.now(timezone.utc)
-                                db.commit()
-                        finally:
-                            db.close()
-                        
-                        # Log site closing
-                        total_time = time.time() - start_time
-                        asyncio.run(self.log_event(
-                            LogLevel.info,
-                            "Site Closed",
-                            f"Closed {site.name} after {site.duration}s",
-                            site.name,
-                            total_time
-                        ))
-                        
-                    except TimeoutException:
-                        asyncio.run(self.log_event(
-                            LogLevel.error,
-                            "Timeout Error",
-                            f"Timeout loading {site.name}",
-                            site.name
-                        ))
-                    except WebDriverException as e:
-                        asyncio.run(self.log_event(
-                            LogLevel.error,
-                            "Browser Error",
-                            f"Browser error for {site.name}: {str(e)}",
-                            site.name
-                        ))
-                    except Exception as e:
-                        asyncio.run(self.log_event(
-                            LogLevel.error,
-                            "Unexpected Error",
-                            f"Unexpected error for {site.name}: {str(e)}",
-                            site.name
-                        ))
-                    
-                    # Wait for the interval before next execution
-                    if not stop_event.wait(global_interval):
-                        continue
-                    else:
-                        break
-                        
-            except Exception as e:
-                asyncio.run(self.log_event(
-                    LogLevel.error,
-                    "Engine Error",
-                    f"Critical error in site processing for {site.name}: {str(e)}",
-                    site.name
-                ))
-            finally:
-                # Clean up browser
-                if browser:
-                    try:
-                        browser.quit()
-                    except:
-                        pass
-                
-                # Remove from active browsers
-                if site_id in self.active_browsers:
-                    del self.active_browsers[site_id]
+                pooled = self.browser_pool.acquire(timeout=1)
+            except TimeoutError:
+                continue
+        
+        browser = pooled.driver
+        self.active_browsers[site_id] = browser
+        start_time = time.time()
+        visited_at = datetime.now(timezone.utc)
+        recorded = False
         
-        # Start the site processing thread
-        thread = threading.Thread(target=run_site_loop, daemon=True)
-        self.site_threads[site_id] = thread
-        thread.start()
+        try:
+            # Log site opening
+            self.log_from_thread(
+                LogLevel.info,
+                "Site Opening",
+                f"Opening {site.name}",
+                site.name
+            )
+            
+            # Navigate to the site
+            pooled.page_loads += 1
+            browser.get(site.url)
+            
+            # Wait for page to load
+            WebDriverWait(browser, 10).until(
+                lambda driver: driver.execute_script("return document.readyState") == "complete"
+            )
+            
+            # Log successful load
+            load_time = time.time() - start_time
+            self.record_visit(site_id, visited_at, True, load_time, self.collect_visit_metrics(browser))
+            recorded = True
+            self.log_from_thread(
+                LogLevel.success,
+                "Site Loaded",
+                f"Successfully loaded {site.name}",
+                site.name,
+                load_time
+            )
+            
+            # Wait for the configured duration, never below a second whatever got stored
+            self.stop_event.wait(max(site.duration or 0, 1))
+            
+            # Update site statistics, written to the database in batches
+            self.click_counter.record(site_id, datetime.now(timezone.utc))
+            self.status_cache.changed()
+            
+            # Log site closing
+            total_time = time.time() - start_time
+            self.log_from_thread(
+                LogLevel.info,
+                "Site Closed",
+                f"Closed {site.name} after {site.duration}s",
+                site.name,
+                total_time
+            )
+            
+        except TimeoutException:
+            if not recorded:
+                self.record_visit(site_id, visited_at, False, time.time() - start_time)
+            self.log_from_thread(
+                LogLevel.error,
+                "Timeout Error",
+                f"Timeout loading {site.name}",
+                site.name
+            )
+        except WebDriverException as e:
+            if not recorded:
+                self.record_visit(site_id, visited_at, False, time.time() - start_time)
+            self.log_from_thread(
+                LogLevel.error,
+                "Browser Error",
+                f"Browser error for {site.name}: {str(e)}",
+                site.name
+            )
+        except Exception as e:
+            if not recorded:
+                self.record_visit(site_id, visited_at, False, time.time() - start_time)
+            self.log_from_thread(
+                LogLevel.error,
+                "Unexpected Error",
+                f"Unexpected error for {site.name}: {str(e)}",
+                site.name
+            )
+        finally:
+            self.active_browsers.pop(site_id, None)
+            # Hand the browser back, the pool recycles or replaces it as needed
+            if pooled.is_healthy():
+                self.browser_pool.release(pooled)
+            else:
+                self.browser_pool.discard(pooled)
     
-    async def start(self):
-        """Start the automation engine"""
+    def run_scheduled_visit(self, site_id: str) -> Optional[float]:
+        """Run one due visit for the scheduler and return the delay until the next one"""
+        site = self.sites.get(site_id)
+        if not site or not self.is_running:
+            return None
+        
+        try:
+            self.visit_site(site)
+        except Exception as e:
+            self.log_from_thread(
+                LogLevel.error,
+                "Engine Error",
+                f"Critical error in site processing for {site.name}: {str(e)}",
+                site.name
+            )
+        
+        return self.interval_for(site)
+    
+    def interval_for(self, site: SiteJob) -> float:
+        """Seconds between visits of a site, the global interval is the fallback"""
+        # Never below a second, whatever got stored
+        return max(site.interval or self.global_interval, 1)
+    
+    def upsert_site(self, job: SiteJob) -> bool:
+        """Add a site to the schedule or update it in place, returns True if it was new"""
+        current = self.sites.get(job.id)
+        # Visits read the job when they start, so a swap applies to the next visit
+        self.sites[job.id] = job
+        
+        if current is None:
+            # The first visit may move anywhere within one interval to spread the load
+            self.scheduler.schedule(job.id, 0, slack=self.interval_for(job))
+            return True
+        
+        if current.interval != job.interval:
+            interval = self.interval_for(job)
+            self.scheduler.schedule(job.id, interval, slack=interval * self.scheduler.max_shift)
+        return False
+    
+    def owns(self, site_id: str) -> bool:
+        """Whether this engine visits a site, always unless it is one of several engine nodes"""
+        return self.cluster is None or self.cluster.owns(site_id)
+    
+    def remove_site(self, site_id: str) -> Optional[SiteJob]:
+        """Take a site off the schedule, a visit in progress finishes normally"""
+        self.scheduler.remove(site_id)
+        return self.sites.pop(site_id, None)
+    
+    async def on_site_event(self, topic: str, payload: dict):
+        """Apply a site CRUD change without restarting the engine"""
+        if topic == "site.deleted":
+            self.site_stats.remove(payload["id"])
+        
+        if not self.is_running:
+            return
+        
+        if topic == "sites.imported":
+            await self.reload_sites()
+            return
+        
+        if topic == "site.deleted" or not payload.get("is_active"):
+            removed = self.remove_site(payload["id"])
+            if removed:
+                await self.log_event(
+                    LogLevel.info,
+                    "Site Unscheduled",
+                    f"Stopped automation for {removed.name}",
+                    removed.name
+                )
+            return
+        
+        if not self.owns(payload["id"]):
+            return
+        
+        job = SiteJob.from_payload(payload)
+        if self.upsert_site(job):
+            self.browser_pool.warm(len(self.sites))
+            await self.log_event(
+                LogLevel.info,
+                "Site Scheduled",
+                f"Started automation for {job.name}",
+                job.name
+            )
+    
+    async def on_setting_changed(self, topic: str, payload: dict):
+        """Apply engine settings live, the next scheduled visits use the new values"""
+        key, value = payload["key"], payload["value"]
+        if key == "global_interval":
+            self.global_interval = value
+            # Sites without their own interval move to the new cadence now
+            for site in self.sites.values():
+                if not site.interval and self.scheduler.is_scheduled(site.id):
+                    self.scheduler.schedule(site.id, delay=value, slack=value * self.scheduler.max_shift)
+        elif key == "schedule_jitter":
+            self.scheduler.jitter = value
+        else:
+            return
+        logger.info(f"Applied setting {key} = {value}")
+    
+    async def reload_sites(self):
+        """Resynchronize the schedule with the active sites in the database"""
+        async with AsyncSessionLocal() as db:
+            sites = await db.scalars(select(Site).where(Site.is_active == True))
+            active_sites = [SiteJob.from_site(site) for site in sites if self.owns(site.id)]
+        
+        active_ids = {job.id for job in active_sites}
+        for site_id in list(self.sites):
+            if site_id not in active_ids:
+                self.remove_site(site_id)
+        for job in active_sites:
+            self.upsert_site(job)
+        self.browser_pool.warm(len(self.sites))
+    
+    async def on_ownership_changed(self, acquired: Set[str], released: Set[str]):
+        """Pick up sites this node was assigned and drop the ones handed to other nodes"""
+        if not self.is_running:
+            return
+        await self.reload_sites()
+        await self.log_event(
+            LogLevel.info,
+            "Sites Rebalanced",
+            f"Node {self.cluster.node_id} took over {len(acquired)} sites and handed off {len(released)}, running {len(self.sites)}"
+        )
+    
+    async def start(self, persist: bool = True):
+        """Start the automation engine, persist=False leaves the stored system status alone"""
         if self.is_running:
             return False
         
+        # Worker threads hand their events back to this loop
+        self.loop_bridge.attach()
+        
+        db = AsyncSessionLocal()
         try:
-            db = next(get_db())
-            
             # Get active sites
-            active_sites = db.query(Site).filter(Site.is_active == True).all()
+            active_sites = [
+                site for site in (await db.scalars(select(Site).where(Site.is_active == True))).all()
+                if self.owns(site.id)
+            ]
             
-            if not active_sites:
+            # An engine node may own no sites yet and gets them when the cluster rebalances
+            if not active_sites and self.cluster is None:
                 await self.log_event(
                     LogLevel.warning,
                     "Start Failed",
@@ -237,14 +461,17 @@ class AutomationEngine:
                 return False
             
             # Get global interval
-            global_interval = int(get_setting(db, "global_interval") or "10")
+            self.global_interval = settings.get("global_interval", 10)
+            self.scheduler.jitter = settings.get("schedule_jitter", 0.1)
             
             self.is_running = True
             self.is_paused = False
+            self.stop_event.clear()
             
             # Update system settings
-            update_setting(db, "system_status", "running")
-            update_setting(db, "is_paused", "false")
+            if persist:
+                await settings.update(db, "system_status", "running")
+                await settings.update(db, "is_paused", "false")
             
             await self.log_event(
                 LogLevel.success,
@@ -252,20 +479,16 @@ class AutomationEngine:
                 f"Started automation for {len(active_sites)} sites"
             )
             
-            # Start processing each active site
+            # Pre-start browsers so the first visits do not pay the cold start
+            self.browser_pool.warm(len(active_sites))
+            
+            # Queue every active site for an immediate first visit
+            self.scheduler.start()
             for site in active_sites:
-                await self.process_site(site, global_interval)
+                self.upsert_site(SiteJob.from_site(site))
             
             # Broadcast status update
-            if self.websocket_manager:
-                await self.websocket_manager.broadcast({
-                    "type": "status",
-                    "data": {
-                        "is_running": True,
-                        "is_paused": False,
-                        "active_sites_count": len(active_sites)
-                    }
-                })
+            await self.broadcast_status()
             
             return True
             
@@ -278,7 +501,7 @@ class AutomationEngine:
             )
             return False
         finally:
-            db.close()
+            await db.close()
     
     async def pause(self):
         """Pause the automation engine"""
@@ -286,10 +509,14 @@ class AutomationEngine:
             return False
         
         self.is_paused = not self.is_paused
+        if self.is_paused:
+            self.scheduler.pause()
+        else:
+            self.scheduler.resume()
         
+        db = AsyncSessionLocal()
         try:
-            db = next(get_db())
-            update_setting(db, "is_paused", "true" if self.is_paused else "false")
+            await settings.update(db, "is_paused", "true" if self.is_paused else "false")
             
             action = "System Paused" if self.is_paused else "System Resumed"
             message = "System execution paused" if self.is_paused else "System execution resumed"
@@ -301,14 +528,7 @@ class AutomationEngine:
             )
             
             # Broadcast status update
-            if self.websocket_manager:
-                await self.websocket_manager.broadcast({
-                    "type": "status",
-                    "data": {
-                        "is_running": True,
-                        "is_paused": self.is_paused
-                    }
-                })
+            await self.broadcast_status()
             
             return True
             
@@ -316,41 +536,39 @@ class AutomationEngine:
             logger.error(f"Failed to pause/resume automation engine: {e}")
             return False
         finally:
-            db.close()
+            await db.close()
     
-    async def stop(self):
-        """Stop the automation engine"""
+    async def stop(self, persist: bool = True):
+        """Stop the automation engine
+
+        persist=False leaves the stored system status alone, for a worker or
+        node that shuts down while the others keep running.
+        """
         if not self.is_running:
             return False
         
+        db = AsyncSessionLocal()
         try:
             self.is_running = False
             self.is_paused = False
             
-            # Stop all site threads
-            for site_id, stop_event in self.stop_events.items():
-                stop_event.set()
+            # Stop dispatching and wait for running visits to finish
+            self.stop_event.set()
+            await asyncio.to_thread(self.scheduler.stop)
             
-            # Wait for threads to finish
-            for thread in self.site_threads.values():
-                thread.join(timeout=5)
+            # Write the visit counts of the last visits
+            await asyncio.to_thread(self.click_counter.stop)
             
-            # Close all browsers
-            for browser in self.active_browsers.values():
-                try:
-                    browser.quit()
-                except:
-                    pass
+            # Leased browsers were returned to the pool, which keeps them warm
             
             # Clear collections
             self.active_browsers.clear()
-            self.site_threads.clear()
-            self.stop_events.clear()
+            self.sites.clear()
             
             # Update system settings
-            db = next(get_db())
-            update_setting(db, "system_status", "stopped")
-            update_setting(db, "is_paused", "false")
+            if persist:
+                await settings.update(db, "system_status", "stopped")
+                await settings.update(db, "is_paused", "false")
             
             await self.log_event(
                 LogLevel.info,
@@ -358,15 +576,11 @@ class AutomationEngine:
                 "Automation system stopped successfully"
             )
             
+            # Drain pending log entries to the database
+            await asyncio.to_thread(self.log_sink.stop)
+            
             # Broadcast status update
-            if self.websocket_manager:
-                await self.websocket_manager.broadcast({
-                    "type": "status",
-                    "data": {
-                        "is_running": False,
-                        "is_paused": False
-                    }
-                })
+            await self.broadcast_status()
             
             return True
             
@@ -374,36 +588,38 @@ class AutomationEngine:
             logger.error(f"Failed to stop automation engine: {e}")
             return False
         finally:
-            if 'db' in locals():
-                db.close()
+            await db.close()
     
     async def get_status(self) -> dict:
         """Get current engine status"""
         try:
-            db = next(get_db())
-            
-            active_sites_count = db.query(Site).filter(Site.is_active == True).count()
-            total_sites_count = db.query(Site).count()
-            total_clicks = db.query(Site).with_entities(Site.clicks).all()
-            total_clicks = sum([clicks[0] for clicks in total_clicks])
-            
-            return {
-                "is_running": self.is_running,
-                "is_paused": self.is_paused,
-                "active_sites_count": active_sites_count,
-                "total_sites_count": total_sites_count,
-                "total_clicks": total_clicks,
-                "active_browsers_count": len(self.active_browsers)
-            }
+            snapshot = await self.status_cache.get()
         except Exception as e:
             logger.error(f"Failed to get engine status: {e}")
-            return {
-                "is_running": False,
-                "is_paused": False,
+            snapshot = {
                 "active_sites_count": 0,
                 "total_sites_count": 0,
                 "total_clicks": 0,
-                "active_browsers_count": 0
+                "global_interval": self.global_interval
             }
-        finally:
-            db.close()
+        
+        state = {"is_running": self.is_running, "is_paused": self.is_paused} if self.is_leader else self.leader_state
+        return {
+            **state,
+            **snapshot,
+            "active_browsers_count": len(self.active_browsers)
+        }
+    
+    async def broadcast_status(self):
+        """Push the full status to websocket clients so they do not have to poll"""
+        # With engine nodes the API workers report the status
+        if self.websocket_manager and self.cluster is None:
+            # Other workers get status from the leader, not from each other
+            await self.websocket_manager.broadcast({
+                "type": "status",
+                "data": await self.get_status()
+            }, local=not self.is_leader)
+    
+    def on_leader_status(self, status: dict):
+        """Mirror the state of the engine running on the leader worker"""
+        self.leader_state = {"is_running": status.get("is_running", False), "is_paused": status.get("is_paused", False)}
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+
+from database import SessionLocal, BackplaneEvent
+from encoders import json_encoder
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Optional, only needed for a redis:// backplane
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# handler(channel, payload) for events published by other workers
+Handler = Callable[[str, Dict[str, Any]], Awaitable]
+
+def make_node_id() -> str:
+    """Identifier of this worker process, unique across restarts"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class Backplane:
+    """Fan-out of events between worker processes
+
+    publish() only reaches the other workers, the publishing worker handles
+    its own copy directly. This base class has no peers and is what a single
+    worker runs with.
+    """
+
+    name = "local"
+
+    def __init__(self, node_id: str):
+        self.node_id = node_id
+        self.handler: Optional[Handler] = None
+        self.published_count = 0
+        self.received_count = 0
+        self.failed_count = 0
+
+    @property
+    def is_distributed(self) -> bool:
+        return type(self) is not Backplane
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def stop(self):
+        pass
+
+    async def publish(self, channel: str, payload: Dict[str, Any]):
+        pass
+
+    async def _receive(self, origin: str, channel: str, payload: Dict[str, Any]):
+        if origin == self.node_id or self.handler is None:
+            return
+        self.received_count += 1
+        try:
+            await self.handler(channel, payload)
+        except Exception as e:
+            logger.error(f"Error handling backplane event on {channel} from {origin}: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "node_id": self.node_id,
+            "published": self.published_count,
+            "received": self.received_count,
+            "failed": self.failed_count,
+        }
+
+class SQLiteBackplane(Backplane):
+    """Events relayed through the backplane_events table of the shared database
+
+    Published events are buffered and written together, then rows from other
+    workers are read, once per poll_interval. Rows older than retention are
+    deleted as part of the same cycle.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, node_id: str, poll_interval: float = 0.1, retention: float = 60.0, batch_size: int = 500):
+        super().__init__(node_id)
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.batch_size = batch_size
+        self._pending: List[Tuple[str, str]] = []
+        self._last_id = 0
+        self._last_prune = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        # Start from the newest row, events from before this worker existed are not replayed
+        self._last_id = await asyncio.to_thread(self._latest_id)
+        self._task = asyncio.create_task(self._run(), name="backplane-sqlite")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        pending, self._pending = self._pending, []
+        if pending:
+            await asyncio.to_thread(self._exchange, pending, False)
+
+    async def publish(self, channel: str, payload: Dict[str, Any]):
+        self._pending.append((channel, json_encoder.dumps(payload).decode("utf-8")))
+        self.published_count += 1
+
+    async def _run(self):
+        while True:
+            pending, self._pending = self._pending, []
+            try:
+                rows = await asyncio.to_thread(self._exchange, pending)
+            except Exception as e:
+                logger.error(f"Backplane poll failed: {e}")
+                self.failed_count += 1
+                self._pending = pending + self._pending
+                rows = []
+
+            for origin, channel, payload in rows:
+                await self._receive(origin, channel, json_encoder.loads(payload))
+            await asyncio.sleep(self.poll_interval)
+
+    def _latest_id(self) -> int:
+        db = SessionLocal()
+        try:
+            return db.scalar(select(func.max(BackplaneEvent.id))) or 0
+        finally:
+            db.close()
+
+    def _exchange(self, pending: List[Tuple[str, str]], read: bool = True) -> List[Tuple[str, str, str]]:
+        """Write this worker's events and read the others' since the last poll, blocking"""
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            if pending:
+                db.execute(insert(BackplaneEvent), [
+                    {"origin": self.node_id, "channel": channel, "payload": payload, "created_at": now}
+                    for channel, payload in pending
+                ])
+            if time.monotonic() - self._last_prune > self.retention:
+                db.execute(delete(BackplaneEvent).where(BackplaneEvent.created_at < now - timedelta(seconds=self.retention)))
+                self._last_prune = time.monotonic()
+            db.commit()
+
+            if not read:
+                return []
+            # SQLite commits one writer at a time, so ids become visible in order and none is skipped
+            rows = db.execute(
+                select(BackplaneEvent.id, BackplaneEvent.origin, BackplaneEvent.channel, BackplaneEvent.payload)
+                .where(BackplaneEvent.id > self._last_id, BackplaneEvent.origin != self.node_id)
+                .order_by(BackplaneEvent.id)
+                .limit(self.batch_size)
+            ).all()
+        finally:
+            db.close()
+
+        if rows:
+            self._last_id = rows[-1].id
+        return [(row.origin, row.channel, row.payload) for row in rows]
+
+class RedisBackplane(Backplane):
+    """Events relayed through pub/sub on a Redis compatible server"""
+
+    name = "redis"
+
+    def __init__(self, node_id: str, url: str, channel: str = "autoclick:backplane"):
+        super().__init__(node_id)
+        self.url = url
+        self.channel = channel
+        self._client = None
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self._client = aioredis.from_url(self.url)
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(), name="backplane-redis")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._pubsub:
+            await self._pubsub.unsubscribe(self.channel)
+            await self._pubsub.close()
+        if self._client:
+            await self._client.close()
+
+    async def publish(self, channel: str, payload: Dict[str, Any]):
+        envelope = {"origin": self.node_id, "channel": channel, "payload": payload}
+        try:
+            await self._client.publish(self.channel, json_encoder.dumps(envelope))
+            self.published_count += 1
+        except Exception as e:
+            logger.error(f"Failed to publish backplane event on {channel}: {e}")
+            self.failed_count += 1
+
+    async def _listen(self):
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    envelope = json_encoder.loads(message["data"])
+                    await self._receive(envelope["origin"], envelope["channel"], envelope["payload"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Backplane subscription failed, retrying: {e}")
+                self.failed_count += 1
+                await asyncio.sleep(1)
+
+def create_backplane(url: Optional[str], node_id: str) -> Backplane:
+    """Backplane for BACKPLANE_URL: empty for a single worker, "sqlite", or a redis:// / unix:// URL"""
+    if not url or url == "local":
+        return Backplane(node_id)
+    if url == "sqlite":
+        return SQLiteBackplane(node_id, poll_interval=float(os.environ.get('BACKPLANE_POLL_INTERVAL', '0.1')))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        if aioredis is None:
+            raise RuntimeError("redis is required for a Redis backplane")
+        return RedisBackplane(node_id, url)
+    raise ValueError(f"Unknown backplane: {url}")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark encoding a page of logs for REST and websocket with each encoder
+
+Usage: python benchmarks/bench_encoders.py [--rows 1000] [--repeat 200]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from database import Log
+from encoders import ENCODERS, model_dicts
+from models import Log as LogSchema
+
+def make_logs(rows: int) -> list:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    levels = ("info", "success", "warning", "error")
+    return [
+        Log(
+            id=str(uuid.uuid4()),
+            timestamp=now - timedelta(seconds=i),
+            level=levels[i % len(levels)],
+            action="Site Loaded",
+            site_name=f"site-{i % 20}",
+            message=f"Visited https://example.com/page/{i} and waited for the configured duration",
+            duration=round(1.5 + (i % 7) * 0.25, 2),
+            created_at=now - timedelta(seconds=i),
+        )
+        for i in range(rows)
+    ]
+
+def timed(fn, repeat: int):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        data = fn()
+    return (time.perf_counter() - start) / repeat * 1000, len(data)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000, help="logs per page")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    logs = make_logs(args.rows)
+    adapter = TypeAdapter(List[LogSchema])
+
+    def validated_stdlib():
+        # What FastAPI did before: validate against response_model, then JSONResponse
+        content = jsonable_encoder(adapter.dump_python(adapter.validate_python(logs), mode="json"))
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    cases = [("REST validated + json", validated_stdlib)]
+    for name, encoder in ENCODERS.items():
+        cases.append((f"REST {name}", lambda encoder=encoder: encoder.dumps(model_dicts(logs, LogSchema))))
+
+    # Websocket side: one "log" message per row, as log_event broadcasts them
+    messages = [{"type": "log", "data": row, "timestamp": row["timestamp"].isoformat()} for row in model_dicts(logs, LogSchema)]
+    cases.append(("WS json default=str", lambda: b"".join(json.dumps(message, default=str).encode() for message in messages)))
+    for name, encoder in ENCODERS.items():
+        cases.append((f"WS {name}", lambda encoder=encoder: b"".join(encoder.dumps(message) for message in messages)))
+
+    print(f"Encoding {args.rows} logs, {args.repeat} runs each\n")
+    print(f"{'':<24}{'ms/page':>10}{'bytes':>12}")
+    for name, fn in cases:
+        ms, size = timed(fn, args.repeat)
+        print(f"{name:<24}{ms:>10.2f}{size:>12}")
+    if "msgpack" not in ENCODERS:
+        print("\nmsgpack is not installed, skipped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Benchmark /api/logs style queries on a synthetic logs table before and after the indexes
+
+Usage: python benchmarks/bench_log_indexes.py [--rows 5000000] [--db /tmp/bench_logs.db]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, desc, select
+
+from database import Log
+
+LEVELS = ["info", "info", "info", "success", "success", "warning", "error"]
+ACTIONS = ["Site Opening", "Site Loaded", "Site Closed", "Timeout Error", "Browser Error"]
+
+def populate(path: str, rows: int, sites: int):
+    """Fill the logs table with rows spread over the last 30 days"""
+    engine = create_engine(f"sqlite:///{path}")
+    Log.__table__.create(bind=engine)
+    # Benchmark the table as it was before the indexes existed
+    for index in Log.__table__.indexes:
+        index.drop(bind=engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    start = datetime.utcnow() - timedelta(days=30)
+    step = 30 * 24 * 3600 / rows
+    batch = []
+    for i in range(rows):
+        timestamp = (start + timedelta(seconds=i * step)).strftime("%Y-%m-%d %H:%M:%S.%f")
+        batch.append((
+            str(uuid.uuid4()),
+            timestamp,
+            random.choice(LEVELS),
+            random.choice(ACTIONS),
+            f"site-{random.randrange(sites)}",
+            "Synthetic benchmark log entry",
+            random.random() * 5,
+            timestamp,
+        ))
+        if len(batch) == 50000:
+            conn.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+
+def queries():
+    """The statements behind get_logs and export_logs"""
+    latest = select(Log).order_by(desc(Log.timestamp))
+    return {
+        "latest page": latest.limit(100),
+        "deep page (offset 10000)": latest.offset(10000).limit(100),
+        "level filter": latest.where(Log.level == "error").limit(100),
+        "site filter": latest.where(Log.site_name == "site-7").limit(100),
+        "site filter, deep page": latest.where(Log.site_name == "site-7").offset(5000).limit(100),
+        "export by site": latest.where(Log.site_name == "site-7"),
+    }
+
+def run(path: str, repeat: int) -> dict:
+    engine = create_engine(f"sqlite:///{path}")
+    results = {}
+    with engine.connect() as conn:
+        for name, statement in queries().items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(statement).fetchall()
+                timings.append(time.perf_counter() - start)
+            results[name] = min(timings)
+    engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--sites", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--db", default="/tmp/bench_logs.db")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+
+    print(f"Populating {args.rows} rows into {args.db}...")
+    start = time.perf_counter()
+    populate(args.db, args.rows, args.sites)
+    print(f"Populated in {time.perf_counter() - start:.1f}s")
+
+    before = run(args.db, args.repeat)
+
+    print("Creating indexes...")
+    engine = create_engine(f"sqlite:///{args.db}")
+    start = time.perf_counter()
+    for index in Log.__table__.indexes:
+        index.create(bind=engine)
+    engine.dispose()
+    print(f"Indexes created in {time.perf_counter() - start:.1f}s")
+
+    after = run(args.db, args.repeat)
+
+    print(f"\n{'query':<28}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<28}{before[name] * 1000:>14.1f}{after[name] * 1000:>14.1f}{speedup:>9.1f}x")
+
+    os.remove(args.db)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Benchmark N log writers against M API readers with the default and the tuned SQLite setup
+
+Usage: python benchmarks/bench_sqlite_concurrency.py [--writers 4] [--readers 8] [--seconds 10]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, desc, event, func, insert, select, update
+from sqlalchemy.exc import OperationalError
+
+from database import Base, Log, Site, engine_options, set_sqlite_pragmas
+
+def make_engine(path: str, tuned: bool):
+    url = f"sqlite:///{path}"
+    if not tuned:
+        # The configuration database.py used before the tuning
+        return create_engine(url, connect_args={"check_same_thread": False})
+    engine = create_engine(url, **engine_options(url))
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+def prepare(path: str, sites: int, rows: int):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        conn.execute(insert(Site), [
+            {"id": f"site-{i}", "name": f"site-{i}", "url": f"https://example.com/{i}", "is_active": True, "clicks": 0}
+            for i in range(sites)
+        ])
+        conn.execute(insert(Log), [
+            {"id": str(uuid.uuid4()), "timestamp": now, "level": "info", "action": "Site Loaded",
+             "site_name": f"site-{i % sites}", "message": "Seed row", "created_at": now}
+            for i in range(rows)
+        ])
+    engine.dispose()
+
+def writer(engine, stop: threading.Event, sites: int, batch: int, stats: dict):
+    """Insert log batches and bump click counters, like the log sink and visit threads"""
+    count = 0
+    while not stop.is_set():
+        now = datetime.now(timezone.utc)
+        rows = [
+            {"id": str(uuid.uuid4()), "timestamp": now, "level": "success", "action": "Site Loaded",
+             "site_name": f"site-{count % sites}", "message": "Benchmark row", "created_at": now}
+            for _ in range(batch)
+        ]
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(Log), rows)
+                conn.execute(update(Site).where(Site.id == f"site-{count % sites}").values(clicks=Site.clicks + 1))
+            stats["writes"] += 1
+        except OperationalError:
+            stats["errors"] += 1
+        count += 1
+
+def reader(engine, stop: threading.Event, sites: int, stats: dict):
+    """Alternate the /api/logs page and /api/status queries, recording latency"""
+    queries = [
+        select(Log).order_by(desc(Log.timestamp), desc(Log.id)).limit(100),
+        select(Log).where(Log.site_name == "site-1").order_by(desc(Log.timestamp)).limit(100),
+        select(func.count(Site.id), func.sum(Site.clicks)),
+    ]
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(queries[i % len(queries)]).fetchall()
+            stats["latencies"].append(time.perf_counter() - start)
+        except OperationalError:
+            stats["errors"] += 1
+        i += 1
+
+def run(path: str, tuned: bool, args) -> dict:
+    prepare(path, args.sites, args.rows)
+    engine = make_engine(path, tuned)
+    stop = threading.Event()
+    write_stats = [{"writes": 0, "errors": 0} for _ in range(args.writers)]
+    read_stats = [{"latencies": [], "errors": 0} for _ in range(args.readers)]
+
+    threads = [threading.Thread(target=writer, args=(engine, stop, args.sites, args.batch, stats)) for stats in write_stats]
+    threads += [threading.Thread(target=reader, args=(engine, stop, args.sites, stats)) for stats in read_stats]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    latencies = sorted(latency for stats in read_stats for latency in stats["latencies"])
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    return {
+        "writes/s": sum(stats["writes"] for stats in write_stats) / args.seconds,
+        "reads/s": len(latencies) / args.seconds,
+        "read p50 ms": quantiles[49] * 1000,
+        "read p99 ms": quantiles[98] * 1000,
+        "locked errors": sum(stats["errors"] for stats in write_stats + read_stats),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--batch", type=int, default=50, help="log rows per write transaction")
+    parser.add_argument("--sites", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=100_000, help="log rows seeded before the run")
+    parser.add_argument("--db", default="/tmp/bench_concurrency.db")
+    args = parser.parse_args()
+
+    results = {}
+    for name, tuned in (("default", False), ("tuned", True)):
+        print(f"Running {args.writers} writers and {args.readers} readers for {args.seconds:g}s ({name})...")
+        results[name] = run(args.db, tuned, args)
+
+    print(f"\n{'':<16}{'default':>12}{'tuned':>12}")
+    for metric in results["default"]:
+        print(f"{metric:<16}{results['default'][metric]:>12.1f}{results['tuned'][metric]:>12.1f}")
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+def _read_rss_kb(pid: int) -> int:
+    """Resident memory of a single process from /proc"""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+def _child_pids(pid: int) -> list:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+def process_tree_rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process and its children (Firefox content processes), in MB"""
+    total_kb = 0
+    pending = [pid]
+    seen = set()
+    try:
+        while pending:
+            current = pending.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            total_kb += _read_rss_kb(current)
+            pending.extend(_child_pids(current))
+    except (OSError, ValueError):
+        if not total_kb:
+            return None
+    return total_kb / 1024
+
+class PooledBrowser:
+    """A pooled Firefox instance and its usage counters"""
+
+    def __init__(self, driver: webdriver.Firefox):
+        self.id = str(uuid.uuid4())[:8]
+        self.driver = driver
+        self.page_loads = 0
+        self.created_at = time.monotonic()
+        self.leased_at: Optional[float] = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        try:
+            return self.driver.capabilities.get("moz:processID")
+        except Exception:
+            return None
+
+    def rss_mb(self) -> Optional[float]:
+        pid = self.pid
+        return process_tree_rss_mb(pid) if pid else None
+
+    def is_healthy(self) -> bool:
+        """Check that the browser session still answers commands"""
+        try:
+            self.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+class BrowserPool:
+    """Keep warm Firefox instances and lease them to site visits"""
+
+    def __init__(
+        self,
+        factory: Callable[[], webdriver.Firefox],
+        size: int = 4,
+        max_page_loads: int = 200,
+        max_rss_mb: float = 1024,
+    ):
+        self.factory = factory
+        self.size = size
+        self.max_page_loads = max_page_loads
+        self.max_rss_mb = max_rss_mb
+
+        self._idle: Deque[PooledBrowser] = deque()
+        self._leased: Dict[str, PooledBrowser] = {}
+        self._starting = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # Counters
+        self.created_count = 0
+        self.recycled_count = 0
+        self.discarded_count = 0
+        self.health_check_failures = 0
+        self.lease_count = 0
+        self.total_wait_time = 0.0
+
+    @property
+    def total(self) -> int:
+        return len(self._idle) + len(self._leased) + self._starting
+
+    def warm(self, count: int = None):
+        """Start browsers in the background until count instances are available"""
+        target = min(self.size if count is None else count, self.size)
+        with self._cond:
+            self._closed = False
+            missing = target - self.total
+            self._starting += max(missing, 0)
+
+        for _ in range(max(missing, 0)):
+            threading.Thread(target=self._start_idle_browser, daemon=True).start()
+
+    def _start_idle_browser(self):
+        try:
+            pooled = self._create()
+        except Exception as e:
+            logger.error(f"Failed to warm browser: {e}")
+            with self._cond:
+                self._starting -= 1
+                self._cond.notify_all()
+            return
+
+        with self._cond:
+            self._starting -= 1
+            if self._closed:
+                pooled.quit()
+            else:
+                self._idle.append(pooled)
+            self._cond.notify_all()
+
+    def _create(self) -> PooledBrowser:
+        pooled = PooledBrowser(self.factory())
+        with self._cond:
+            self.created_count += 1
+        logger.info(f"Started pooled browser {pooled.id}")
+        return pooled
+
+    def acquire(self, timeout: float = None) -> PooledBrowser:
+        """Lease a healthy browser, starting one if the pool has room"""
+        wait_start = time.monotonic()
+        deadline = wait_start + timeout if timeout is not None else None
+
+        while True:
+            candidate = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Browser pool is shut down")
+                    if self._idle:
+                        candidate = self._idle.popleft()
+                        break
+                    if self.total < self.size:
+                        self._starting += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("No browser available in pool")
+                    self._cond.wait(remaining)
+
+            if create:
+                try:
+                    candidate = self._create()
+                except Exception:
+                    with self._cond:
+                        self._starting -= 1
+                        self._cond.notify_all()
+                    raise
+            elif not candidate.is_healthy():
+                # Dead session, replace it on the next iteration
+                logger.warning(f"Pooled browser {candidate.id} failed health check")
+                with self._cond:
+                    self.health_check_failures += 1
+                    self.discarded_count += 1
+                candidate.quit()
+                continue
+
+            with self._cond:
+                if create:
+                    self._starting -= 1
+                if self._closed:
+                    candidate.quit()
+                    raise RuntimeError("Browser pool is shut down")
+                candidate.leased_at = time.monotonic()
+                self._leased[candidate.id] = candidate
+                self.lease_count += 1
+                self.total_wait_time += candidate.leased_at - wait_start
+            return candidate
+
+    def release(self, pooled: PooledBrowser):
+        """Return a browser to the pool, recycling it if it is worn out"""
+        recycle = self._should_recycle(pooled)
+        if not recycle:
+            try:
+                # Stop any page activity before the next lease
+                pooled.driver.get("about:blank")
+            except WebDriverException:
+                recycle = True
+
+        with self._cond:
+            self._leased.pop(pooled.id, None)
+            closed = self._closed
+            if not recycle and not closed:
+                pooled.leased_at = None
+                self._idle.append(pooled)
+            elif recycle:
+                self.recycled_count += 1
+                # Only the recycled browser is replaced, the engine sizes the pool to its sites
+                replace_to = self.total + 1
+            self._cond.notify_all()
+
+        if recycle or closed:
+            pooled.quit()
+        if recycle and not closed:
+            logger.info(f"Recycled pooled browser {pooled.id} after {pooled.page_loads} page loads")
+            self.warm(replace_to)
+
+    def discard(self, pooled: PooledBrowser):
+        """Drop a broken browser without returning it to the pool"""
+        with self._cond:
+            self._leased.pop(pooled.id, None)
+            self.discarded_count += 1
+            self._cond.notify_all()
+        pooled.quit()
+
+    def _should_recycle(self, pooled: PooledBrowser) -> bool:
+        if self.max_page_loads and pooled.page_loads >= self.max_page_loads:
+            return True
+        if self.max_rss_mb:
+            rss = pooled.rss_mb()
+            if rss is not None and rss >= self.max_rss_mb:
+                logger.info(f"Pooled browser {pooled.id} uses {rss:.0f} MB, recycling")
+                return True
+        return False
+
+    def shutdown(self):
+        """Quit idle browsers now and leased ones as they are released"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+        for pooled in idle:
+            pooled.quit()
+
+    def get_stats(self) -> dict:
+        """Get pool size and utilization"""
+        with self._cond:
+            leased = len(self._leased)
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "leased": leased,
+                "starting": self._starting,
+                "utilization": round(leased / self.size, 3) if self.size else 0.0,
+                "created": self.created_count,
+                "recycled": self.recycled_count,
+                "discarded": self.discarded_count,
+                "health_check_failures": self.health_check_failures,
+                "leases": self.lease_count,
+                "avg_lease_wait_ms": round(self.total_wait_time / self.lease_count * 1000, 3) if self.lease_count else 0.0,
+            }
@@ -0,0 +1,140 @@
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+
+from database import SessionLocal, Site
+
+logger = logging.getLogger(__name__)
+
+class ClickCounter:
+    """Accumulate visit counts per site in memory and flush them as batched atomic increments
+
+    The database only ever sees "clicks = clicks + n", so counts from concurrent
+    visits are never lost to a read-modify-write race.
+    """
+
+    def __init__(self, flush_interval: float = 2.0):
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Tuple[int, datetime]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        self.recorded_count = 0
+        self.flush_count = 0
+        self.flushed_visits = 0
+        self.failed_flushes = 0
+
+        # Counts still in memory when the interpreter exits are written out too
+        atexit.register(self.flush)
+
+    def start(self):
+        """Start the periodic flusher if it is not running"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="click-counter", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the flusher and write everything still pending"""
+        with self._lock:
+            thread = self._thread
+            self._stop_event.set()
+
+        if thread and thread.is_alive():
+            thread.join(timeout=timeout)
+        self.flush()
+
+    def record(self, site_id: str, timestamp: datetime):
+        """Count one completed visit"""
+        self.start()
+        with self._lock:
+            count, last_access = self._pending.get(site_id, (0, timestamp))
+            self._pending[site_id] = (count + 1, max(last_access, timestamp))
+            self.recorded_count += 1
+
+    def pending(self) -> Dict[str, int]:
+        """Visits per site recorded but not flushed yet"""
+        with self._lock:
+            return {site_id: count for site_id, (count, _) in self._pending.items()}
+
+    def totals(self) -> Tuple[int, int]:
+        """Visits recorded since start and visits not flushed yet, read together"""
+        with self._lock:
+            return self.recorded_count, sum(count for count, _ in self._pending.values())
+
+    @contextmanager
+    def settled(self):
+        """Hold off flushes, so database counts plus totals() neither miss nor repeat a visit"""
+        with self._flush_lock:
+            yield
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self) -> int:
+        """Write pending counts in one transaction, returns the number of visits written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                pending, self._pending = self._pending, {}
+
+            rows = [
+                {"site_id": site_id, "visits": count, "visited_at": last_access}
+                for site_id, (count, last_access) in pending.items()
+            ]
+            statement = (
+                update(Site.__table__)
+                .where(Site.__table__.c.id == bindparam("site_id"))
+                .values(clicks=Site.__table__.c.clicks + bindparam("visits"), last_access=bindparam("visited_at"))
+            )
+
+            start_time = time.perf_counter()
+            db = SessionLocal()
+            try:
+                db.execute(statement, rows)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to flush visit counts for {len(rows)} sites: {e}")
+                self._restore(pending)
+                with self._lock:
+                    self.failed_flushes += 1
+                return 0
+            finally:
+                db.close()
+
+            visits = sum(row["visits"] for row in rows)
+            with self._lock:
+                self.flush_count += 1
+                self.flushed_visits += visits
+            logger.debug(f"Flushed {visits} visits for {len(rows)} sites in {(time.perf_counter() - start_time) * 1000:.1f}ms")
+            return visits
+
+    def _restore(self, pending: Dict[str, Tuple[int, datetime]]):
+        """Merge counts from a failed flush back so the next flush retries them"""
+        with self._lock:
+            for site_id, (count, last_access) in pending.items():
+                current, current_access = self._pending.get(site_id, (0, last_access))
+                self._pending[site_id] = (current + count, max(current_access, last_access))
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending_sites": len(self._pending),
+                "pending_visits": sum(count for count, _ in self._pending.values()),
+                "flushes": self.flush_count,
+                "flushed_visits": self.flushed_visits,
+                "failed_flushes": self.failed_flushes,
+            }
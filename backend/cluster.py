@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import math
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, Site, SiteLease, Worker
+from loop_bridge import LoopBridge
+
+logger = logging.getLogger(__name__)
+
+def rendezvous_owner(site_id: str, nodes: Dict[str, int]) -> Optional[str]:
+    """Node a site hashes to, weighted by capacity
+
+    Highest random weight hashing: adding or removing a node only moves the
+    sites that hash to that node.
+    """
+    best, best_score = None, -math.inf
+    for node_id, capacity in nodes.items():
+        digest = hashlib.sha1(f"{site_id}:{node_id}".encode()).digest()
+        # Uniform in (0, 1), never exactly 0 or 1
+        u = (int.from_bytes(digest[:8], "big") + 0.5) / 2 ** 64
+        score = max(capacity, 1) / -math.log(u)
+        if score > best_score:
+            best, best_score = node_id, score
+    return best
+
+class ClusterNode:
+    """Membership and site ownership of one engine node in a multi-node deployment
+
+    Every heartbeat_interval the node records itself in the workers table,
+    divides the active sites among the live nodes by rendezvous hashing and
+    renews or takes the site_leases rows of its share. A node only visits the
+    sites it holds leases for. When a node stops heartbeating its leases run
+    out after lease_ttl and the nodes its sites now hash to take them over.
+    """
+
+    def __init__(
+        self,
+        node_id: str,
+        capacity: int,
+        loop_bridge: LoopBridge,
+        on_change: Optional[Callable[[Set[str], Set[str]], Awaitable]] = None,
+        heartbeat_interval: float = 5.0,
+        lease_ttl: float = 15.0,
+    ):
+        # on_change(acquired, released) runs on the server loop when the owned sites change
+        self.node_id = node_id
+        self.capacity = capacity
+        self.loop_bridge = loop_bridge
+        self.on_change = on_change
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_ttl = lease_ttl
+        self.owned: Set[str] = set()
+        self.live_nodes: Dict[str, int] = {}
+        # Sites handed off last tick, their leases are dropped once visits in progress had time to end
+        self._draining: Set[str] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+        self.ticks = 0
+        self.failed_ticks = 0
+        self.acquired_count = 0
+        self.released_count = 0
+
+    def owns(self, site_id: str) -> bool:
+        with self._lock:
+            return site_id in self.owned
+
+    def start(self):
+        """Join the cluster and start heartbeating"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="cluster-node", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Leave the cluster, freeing the leases so other nodes take the sites over right away"""
+        with self._lock:
+            thread = self._thread
+            self._stop_event.set()
+
+        if thread and thread.is_alive():
+            thread.join(timeout=timeout)
+
+        db = SessionLocal()
+        try:
+            db.execute(delete(SiteLease).where(SiteLease.node_id == self.node_id))
+            db.execute(delete(Worker).where(Worker.node_id == self.node_id))
+            db.commit()
+        except Exception as e:
+            logger.error(f"Failed to leave the cluster: {e}")
+        finally:
+            db.close()
+        with self._lock:
+            self.owned = set()
+
+    def _run(self):
+        while True:
+            try:
+                acquired, released = self.tick()
+                if (acquired or released) and self.on_change:
+                    self.loop_bridge.submit(self.on_change(acquired, released))
+            except Exception as e:
+                logger.error(f"Cluster heartbeat failed: {e}")
+                self.failed_ticks += 1
+            if self._stop_event.wait(self.heartbeat_interval):
+                return
+
+    def tick(self):
+        """Heartbeat and rebalance once, returns the sites acquired and released, blocking"""
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.lease_ttl)
+        db = SessionLocal()
+        try:
+            self._heartbeat(db, now)
+            db.commit()
+
+            live_nodes = dict(db.execute(
+                select(Worker.node_id, Worker.capacity)
+                .where(Worker.heartbeat_at >= now - timedelta(seconds=self.lease_ttl))
+            ).all())
+            live_nodes[self.node_id] = self.capacity
+            active_sites = db.scalars(select(Site.id).where(Site.is_active == True)).all()
+            desired = {site_id for site_id in active_sites if rendezvous_owner(site_id, live_nodes) == self.node_id}
+
+            held = set(db.scalars(select(SiteLease.site_id).where(SiteLease.node_id == self.node_id)))
+            with self._lock:
+                owned = set(self.owned)
+
+            # Drop leases of sites handed off on the previous tick
+            draining = (self._draining & held) - desired
+            if draining:
+                db.execute(delete(SiteLease).where(SiteLease.node_id == self.node_id, SiteLease.site_id.in_(draining)))
+
+            keep = desired & held
+            if keep:
+                renewed = db.execute(
+                    update(SiteLease)
+                    .where(SiteLease.node_id == self.node_id, SiteLease.site_id.in_(keep))
+                    .values(expires_at=expires_at)
+                )
+                if renewed.rowcount != len(keep):
+                    # Someone took a lease we let expire, find out which
+                    keep = set(db.scalars(select(SiteLease.site_id).where(SiteLease.node_id == self.node_id, SiteLease.site_id.in_(keep))))
+
+            taken = {site_id for site_id in desired - held if self._take(db, site_id, now, expires_at)}
+            db.commit()
+        finally:
+            db.close()
+
+        now_owned = keep | taken
+        with self._lock:
+            self.owned = now_owned
+            self.live_nodes = live_nodes
+        # Still held leases of sites given up now are released next tick
+        self._draining = (held - desired) | (owned - now_owned)
+        acquired, released = now_owned - owned, owned - now_owned
+        self.ticks += 1
+        self.acquired_count += len(acquired)
+        self.released_count += len(released)
+        if acquired or released:
+            logger.info(
+                f"Node {self.node_id} now owns {len(now_owned)} of {len(active_sites)} sites "
+                f"(+{len(acquired)} -{len(released)}, {len(live_nodes)} live nodes)"
+            )
+        return acquired, released
+
+    def _heartbeat(self, db, now: datetime):
+        result = db.execute(
+            update(Worker)
+            .where(Worker.node_id == self.node_id)
+            .values(heartbeat_at=now, capacity=self.capacity)
+        )
+        if result.rowcount == 0:
+            db.add(Worker(
+                node_id=self.node_id,
+                hostname=socket.gethostname(),
+                pid=os.getpid(),
+                capacity=self.capacity,
+                started_at=now,
+                heartbeat_at=now
+            ))
+        # Forget nodes that have been gone for a while
+        db.execute(delete(Worker).where(Worker.heartbeat_at < now - timedelta(seconds=self.lease_ttl * 4)))
+
+    def _take(self, db, site_id: str, now: datetime, expires_at: datetime) -> bool:
+        """Lease a site if it is free or its lease expired"""
+        result = db.execute(
+            update(SiteLease)
+            .where(SiteLease.site_id == site_id, SiteLease.expires_at < now)
+            .values(node_id=self.node_id, acquired_at=now, expires_at=expires_at)
+        )
+        if result.rowcount:
+            return True
+        if db.scalar(select(SiteLease.node_id).where(SiteLease.site_id == site_id)) is not None:
+            # Its previous owner has not handed it over yet
+            return False
+        try:
+            with db.begin_nested():
+                db.add(SiteLease(site_id=site_id, node_id=self.node_id, acquired_at=now, expires_at=expires_at))
+            return True
+        except IntegrityError:
+            return False
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "node_id": self.node_id,
+                "capacity": self.capacity,
+                "owned_sites": len(self.owned),
+                "live_nodes": len(self.live_nodes),
+                "ticks": self.ticks,
+                "failed_ticks": self.failed_ticks,
+                "acquired": self.acquired_count,
+                "released": self.released_count,
+            }
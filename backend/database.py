@@ -1,8 +1,13 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, Float
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, DateTime, Text, Float, Index, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.sql import func
+from contextlib import contextmanager
 from datetime import datetime
+import fcntl
 import os
 from dotenv import load_dotenv
 
@@ -11,14 +16,73 @@ load_dotenv()
 # Database Configuration - SQLite
 DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///./autoclick.db')
 
-# SQLite specific configuration
-engine = create_engine(
-    DATABASE_URL, 
-    echo=False,
-    connect_args={"check_same_thread": False}  # Necessário para SQLite + FastAPI
-)
+# SQLite tuning for concurrent writers (site threads, log sink) and API readers
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', '16384'))  # per connection
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+# Connections kept open, sized for the browser workers, log sink and API threadpool
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+
+def engine_options(url: str) -> dict:
+    """Keyword arguments for create_engine for the given database URL"""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT, "pool_pre_ping": True}
+    
+    options = {
+        "connect_args": {
+            "check_same_thread": False,  # Necessário para SQLite + FastAPI
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000
+        }
+    }
+    # In-memory databases live in a single connection and keep SQLAlchemy's default pool
+    if url.database and url.database != ":memory:":
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+def set_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """Configure every new SQLite connection, registered as a connect event listener"""
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers run alongside the single writer instead of waiting on its lock
+        cursor.execute("PRAGMA journal_mode = WAL")
+        # Durable across application crashes, only a power loss can drop the last commits
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+    finally:
+        cursor.close()
+
+engine = create_engine(DATABASE_URL, echo=False, **engine_options(DATABASE_URL))
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", set_sqlite_pragmas)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers for the same database, used by the API routes
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql", "mariadb": "aiomysql"}
+
+def async_database_url(url: str) -> str:
+    """Swap the URL's driver for its asyncio counterpart"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend} databases")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+async_engine = create_async_engine(async_database_url(DATABASE_URL), echo=False, **engine_options(DATABASE_URL))
+
+if async_engine.dialect.name == "sqlite":
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+# Objects stay usable after commit, an AsyncSession cannot lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # Database Models
@@ -38,6 +102,12 @@ class Site(Base):
 
 class Log(Base):
     __tablename__ = "logs"
+    # Match the filters and ordering used by /api/logs and /api/logs/export
+    __table_args__ = (
+        Index("ix_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_logs_site_name_timestamp", "site_name", "timestamp"),
+        Index("ix_logs_level_timestamp", "level", "timestamp"),
+    )
     
     id = Column(String(50), primary_key=True, index=True)
     timestamp = Column(DateTime, server_default=func.now())
@@ -48,6 +118,78 @@ class Log(Base):
     duration = Column(Float, nullable=True)  # execution duration in seconds
     created_at = Column(DateTime, server_default=func.now())
 
+class VisitMetric(Base):
+    __tablename__ = "visit_metrics"
+    # Keyed by (site_id, timestamp) without a separate rowid to keep rows small
+    __table_args__ = {"sqlite_with_rowid": False}
+    
+    site_id = Column(String(50), primary_key=True)
+    timestamp = Column(DateTime, primary_key=True)
+    success = Column(Boolean, nullable=False, default=True)
+    # Timings in milliseconds from navigation start, NULL when the browser did not report them
+    load_time_ms = Column(Integer, nullable=True)  # wall clock around browser.get
+    dns_ms = Column(Integer, nullable=True)
+    connect_ms = Column(Integer, nullable=True)
+    ttfb_ms = Column(Integer, nullable=True)
+    dom_content_loaded_ms = Column(Integer, nullable=True)
+    load_event_ms = Column(Integer, nullable=True)
+    first_contentful_paint_ms = Column(Integer, nullable=True)
+    transfer_size = Column(Integer, nullable=True)  # bytes
+
+class LogRollup(Base):
+    __tablename__ = "log_rollups"
+    # Hourly per-site, per-level counts of log rows that retention has pruned
+    __table_args__ = {"sqlite_with_rowid": False}
+    
+    hour = Column(DateTime, primary_key=True)  # start of the hour, UTC
+    site_name = Column(String(255), primary_key=True, default="")  # empty for system logs
+    level = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    duration_count = Column(Integer, nullable=False, default=0)  # rows that had a duration
+    duration_sum = Column(Float, nullable=False, default=0.0)
+    duration_max = Column(Float, nullable=True)
+
+class BackplaneEvent(Base):
+    __tablename__ = "backplane_events"
+    # Events workers fan out to each other, read by id and pruned after a short time
+    # AUTOINCREMENT so ids are never reused once old rows are pruned
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    origin = Column(String(100), nullable=False)  # node id of the publishing worker
+    channel = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(DateTime, nullable=False, index=True)
+
+class Lease(Base):
+    __tablename__ = "leases"
+    # Named leases, held by one node until it stops renewing them
+    
+    name = Column(String(100), primary_key=True)
+    holder = Column(String(100), nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class Worker(Base):
+    __tablename__ = "workers"
+    # Engine nodes of a multi-node deployment, live while heartbeat_at is recent
+    
+    node_id = Column(String(100), primary_key=True)
+    hostname = Column(String(255), nullable=False)
+    pid = Column(Integer, nullable=False)
+    capacity = Column(Integer, nullable=False, default=1)  # browsers, weighs the share of sites
+    started_at = Column(DateTime, nullable=False)
+    heartbeat_at = Column(DateTime, nullable=False, index=True)
+
+class SiteLease(Base):
+    __tablename__ = "site_leases"
+    # The engine node visiting a site, until it stops renewing the lease
+    
+    site_id = Column(String(50), primary_key=True)
+    node_id = Column(String(100), nullable=False, index=True)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
 class SystemSettings(Base):
     __tablename__ = "system_settings"
     
@@ -64,26 +206,155 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Advisory lock held while a process sets up the database, any constant shared by all of them
+BOOTSTRAP_LOCK_KEY = 72616
+BOOTSTRAP_LOCK_NAME = "autoclick_bootstrap"
+
+@contextmanager
+def bootstrap_lock():
+    """Let one process at a time set up the schema and default settings
+
+    uvicorn workers and engine nodes all bootstrap on startup, and on a fresh
+    database they would otherwise race creating the same tables and rows.
+    """
+    url = make_url(DATABASE_URL)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        if not url.database or url.database == ":memory:":
+            yield
+            return
+        # Workers sharing a SQLite file share a host, a lock file next to it is enough
+        with open(f"{url.database}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+    
+    if backend == "postgresql":
+        lock, unlock = "SELECT pg_advisory_lock(:key)", "SELECT pg_advisory_unlock(:key)"
+        params = {"key": BOOTSTRAP_LOCK_KEY}
+    elif backend in ("mysql", "mariadb"):
+        lock, unlock = "SELECT GET_LOCK(:key, -1)", "SELECT RELEASE_LOCK(:key)"
+        params = {"key": BOOTSTRAP_LOCK_NAME}
+    else:
+        yield
+        return
+    
+    # Session level lock, held by this connection until released
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(lock), params)
+        try:
+            yield
+        finally:
+            conn.execute(text(unlock), params)
+
+def bootstrap_database():
+    """Create the tables and default settings, safe to run from several processes at once"""
+    with bootstrap_lock():
+        create_tables()
+        db = SessionLocal()
+        try:
+            init_system_settings(db)
+        finally:
+            db.close()
+
 def create_tables():
     """Create all tables"""
     Base.metadata.create_all(bind=engine)
+    run_migrations()
+
+def run_migrations():
+    """Apply schema changes that create_all skips on existing tables"""
+    # Indexes added to the logs table after it was first created
+    for index in Log.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    
+    # Superseded by ix_logs_timestamp_id, which also serves keyset pagination
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ix_logs_timestamp"))
+        
+        if engine.dialect.name == "sqlite":
+            create_log_search_index(conn)
+    
+    if engine.dialect.name == "sqlite":
+        enable_incremental_vacuum()
+
+def create_log_search_index(conn):
+    """Create the FTS5 index over log text and the triggers that keep it in sync"""
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'logs_fts'")).first()
+    
+    # External content table: the text lives in logs, FTS5 only stores the index
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5("
+        "message, action, site_name, content='logs', content_rowid='rowid')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS logs_fts_insert AFTER INSERT ON logs BEGIN "
+        "INSERT INTO logs_fts(rowid, message, action, site_name) "
+        "VALUES (new.rowid, new.message, new.action, new.site_name); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS logs_fts_delete AFTER DELETE ON logs BEGIN "
+        "INSERT INTO logs_fts(logs_fts, rowid, message, action, site_name) "
+        "VALUES ('delete', old.rowid, old.message, old.action, old.site_name); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS logs_fts_update AFTER UPDATE ON logs BEGIN "
+        "INSERT INTO logs_fts(logs_fts, rowid, message, action, site_name) "
+        "VALUES ('delete', old.rowid, old.message, old.action, old.site_name); "
+        "INSERT INTO logs_fts(rowid, message, action, site_name) "
+        "VALUES (new.rowid, new.message, new.action, new.site_name); END"
+    ))
+    if not exists:
+        # Index the rows that existed before the table was created
+        conn.execute(text("INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')"))
+
+def enable_incremental_vacuum():
+    """Switch the database to incremental auto-vacuum so retention can return freed pages"""
+    # The mode only takes effect after a full VACUUM, which cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+            return
+        
+        conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        conn.execute(text("VACUUM"))
+        # VACUUM may renumber the implicit rowids of logs, which logs_fts is keyed by
+        conn.execute(text("INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')"))
 
 def init_system_settings(db: Session):
     """Initialize default system settings"""
     default_settings = [
         {"key": "global_interval", "value": "10"},
+        {"key": "schedule_jitter", "value": "0.1"},
         {"key": "max_sites", "value": "10"},
         {"key": "browser_type", "value": "firefox"},
         {"key": "execution_mode", "value": "load_only"},
         {"key": "system_status", "value": "stopped"},
-        {"key": "is_paused", "value": "false"}
+        {"key": "is_paused", "value": "false"},
+        # Days to keep raw log rows per level before rolling them up, 0 keeps them forever
+        {"key": "log_retention_info_days", "value": "7"},
+        {"key": "log_retention_success_days", "value": "7"},
+        {"key": "log_retention_warning_days", "value": "30"},
+        {"key": "log_retention_error_days", "value": "90"},
+        {"key": "visit_metric_retention_days", "value": "30"}
     ]
     
+    existing = {key for (key,) in db.query(SystemSettings.key)}
     for setting in default_settings:
-        existing = db.query(SystemSettings).filter(SystemSettings.key == setting["key"]).first()
-        if not existing:
-            db_setting = SystemSettings(**setting)
-            db.add(db_setting)
+        if setting["key"] in existing:
+            continue
+        try:
+            with db.begin_nested():
+                db.add(SystemSettings(**setting))
+        except IntegrityError:
+            # Another process inserted it first
+            pass
     
     db.commit()
 
@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Type, Union
+
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional, the stdlib encoder is used without it
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional, only needed for the msgpack websocket subprotocol
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+class Encoder:
+    """Serializes API payloads, encode() gives what a websocket frame carries"""
+
+    name = "json"
+    binary = False
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+    def encode(self, obj: Any) -> Union[str, bytes]:
+        return self.dumps(obj).decode("utf-8")
+
+    def batch(self, frames: List[Union[str, bytes]]) -> Union[str, bytes]:
+        """One {"type": "batch", "data": [...]} frame from already encoded messages"""
+        return '{"type":"batch","data":[' + ",".join(frames) + "]}"
+
+class OrjsonEncoder(Encoder):
+    name = "orjson"
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+class MsgpackEncoder(Encoder):
+    name = "msgpack"
+    binary = True
+
+    def dumps(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, default=_default, datetime=False)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return msgpack.unpackb(data)
+
+    def encode(self, obj: Any) -> bytes:
+        return self.dumps(obj)
+
+    def batch(self, frames: List[bytes]) -> bytes:
+        packer = msgpack.Packer()
+        return (
+            b"\x82" + packer.pack("type") + packer.pack("batch") + packer.pack("data")
+            + packer.pack_array_header(len(frames)) + b"".join(frames)
+        )
+
+# Encoders usable here, by name
+ENCODERS: Dict[str, Encoder] = {"json": Encoder()}
+if orjson is not None:
+    ENCODERS["orjson"] = OrjsonEncoder()
+if msgpack is not None:
+    ENCODERS["msgpack"] = MsgpackEncoder()
+
+# Websocket subprotocols a client may ask for at connect, JSON text frames without one
+SUBPROTOCOLS: Dict[str, str] = {"msgpack": "msgpack", "json": "orjson" if orjson is not None else "json"}
+
+def get_encoder(name: str) -> Encoder:
+    """Encoder by name, falls back to stdlib json when its library is missing"""
+    if name in ENCODERS:
+        return ENCODERS[name]
+    if name in ("orjson", "msgpack"):
+        logger.warning(f"{name} is not installed, using the stdlib json encoder")
+        return ENCODERS["json"]
+    raise ValueError(f"Unknown encoder: {name}")
+
+def negotiate_subprotocol(requested: Iterable[str]) -> Optional[str]:
+    """First subprotocol the client offered that an installed encoder serves"""
+    for subprotocol in requested:
+        if subprotocol in SUBPROTOCOLS and SUBPROTOCOLS[subprotocol] in ENCODERS:
+            return subprotocol
+    return None
+
+def model_dicts(rows: Iterable, schema: Type[BaseModel]) -> List[dict]:
+    """ORM rows as plain dicts of a schema's fields, without validating them"""
+    fields = tuple(schema.model_fields)
+    return [{name: getattr(row, name) for name in fields} for row in rows]
+
+# Encoder for REST responses and websocket text frames
+json_encoder = get_encoder(os.environ.get("JSON_ENCODER", "orjson"))
+
+class EncodedJSONResponse(JSONResponse):
+    """JSONResponse rendered with the configured encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return json_encoder.dumps(content)
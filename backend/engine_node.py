@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Run an engine node that visits its share of the active sites
+
+Engine nodes coordinate through the shared database: each heartbeats into the
+workers table and visits the sites it holds site_leases for. Start the API with
+ENGINE_NODES=1 so it leaves visits to the nodes, then start nodes on any number
+of hosts with the same DATABASE_URL. They start, pause and stop as requested
+through the API and pick up site edits every poll interval.
+
+Usage: python engine_node.py [--heartbeat 5] [--lease-ttl 15] [--poll-interval 2]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+from contextlib import suppress
+
+sys.path.append(os.path.dirname(__file__))
+
+from automation_engine import AutomationEngine
+from backplane import create_backplane, make_node_id
+from cluster import ClusterNode
+from database import SessionLocal, bootstrap_database
+from settings_cache import settings
+from websocket_manager import manager as websocket_manager
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("engine_node")
+
+def load_settings():
+    db = SessionLocal()
+    try:
+        settings.load(db)
+    finally:
+        db.close()
+
+async def follow_requested_state(engine: AutomationEngine):
+    """Start, pause or stop the engine to match the state stored through the API, and resync its sites"""
+    await asyncio.to_thread(load_settings)
+    wanted = settings.get("system_status") == "running"
+    if wanted and not engine.is_running:
+        await engine.start(persist=False)
+    elif not wanted and engine.is_running:
+        await engine.stop(persist=False)
+    if engine.is_running and settings.get("is_paused", False) != engine.is_paused:
+        await engine.pause()
+    if engine.is_running:
+        # Applies URL, duration and interval edits to sites this node already owns
+        await engine.reload_sites()
+
+async def ignore_event(channel: str, payload: dict):
+    # Nodes reload their sites from the database every poll interval instead
+    pass
+
+async def run(args):
+    node_id = make_node_id()
+    bootstrap_database()
+
+    engine = AutomationEngine(websocket_manager)
+    engine.loop_bridge.attach()
+
+    # With a backplane, logs from this node reach the dashboards connected to the API workers
+    backplane = create_backplane(os.environ.get('BACKPLANE_URL', ''), node_id)
+    websocket_manager.backplane = backplane
+    await backplane.start(ignore_event)
+
+    cluster = ClusterNode(
+        node_id,
+        engine.browser_pool.size,
+        engine.loop_bridge,
+        on_change=engine.on_ownership_changed,
+        heartbeat_interval=args.heartbeat,
+        lease_ttl=args.lease_ttl
+    )
+    engine.cluster = cluster
+    cluster.start()
+    logger.info(f"Engine node {node_id} started with capacity {cluster.capacity}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    while not stop.is_set():
+        try:
+            await follow_requested_state(engine)
+        except Exception as e:
+            logger.error(f"Failed to apply the requested engine state: {e}")
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop.wait(), args.poll_interval)
+
+    logger.info(f"Engine node {node_id} shutting down")
+    # The other nodes keep running, so the stored status is left alone
+    await engine.stop(persist=False)
+    await asyncio.to_thread(cluster.stop)
+    await asyncio.to_thread(engine.click_counter.stop)
+    await asyncio.to_thread(engine.log_sink.stop)
+    engine.browser_pool.shutdown()
+    await backplane.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--heartbeat", type=float, default=float(os.environ.get('NODE_HEARTBEAT_INTERVAL', '5')),
+                        help="seconds between heartbeats and rebalancing")
+    parser.add_argument("--lease-ttl", type=float, default=float(os.environ.get('NODE_LEASE_TTL', '15')),
+                        help="seconds before the sites of a silent node are taken over")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="seconds between checks of the requested engine state and the sites")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
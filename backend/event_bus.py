@@ -0,0 +1,42 @@
+import inspect
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+class EventBus:
+    """In-process publish/subscribe for site and settings changes"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Callable[[str, Dict[str, Any]], Any]]] = defaultdict(list)
+        # Relays events to the other worker processes, if there are any
+        self.backplane = None
+
+    def subscribe(self, topic: str, callback: Callable[[str, Dict[str, Any]], Any]):
+        """Call callback(topic, payload) for every event on topic, "*" matches all topics"""
+        self._subscribers[topic].append(callback)
+
+    def unsubscribe(self, topic: str, callback: Callable[[str, Dict[str, Any]], Any]):
+        if callback in self._subscribers.get(topic, []):
+            self._subscribers[topic].remove(callback)
+
+    async def publish(self, topic: str, payload: Dict[str, Any]):
+        """Deliver an event here and on every other worker"""
+        await self.deliver(topic, payload)
+        if self.backplane:
+            await self.backplane.publish("event", {"topic": topic, "payload": payload})
+
+    async def deliver(self, topic: str, payload: Dict[str, Any]):
+        """Deliver an event to this process's subscribers, awaiting async callbacks in order"""
+        callbacks = list(self._subscribers.get(topic, [])) + list(self._subscribers.get("*", []))
+        for callback in callbacks:
+            try:
+                result = callback(topic, payload)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Error handling event {topic}: {e}")
+
+# Global event bus instance
+event_bus = EventBus()
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import case, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal, Lease
+from loop_bridge import LoopBridge
+
+logger = logging.getLogger(__name__)
+
+class LeaderElection:
+    """Keep one worker holding a named lease in the leases table
+
+    The holder renews the lease every renew_interval. When it stops, another
+    worker takes the lease over once it is ttl seconds old. Becoming and
+    losing leader are reported through on_elected and on_demoted, run on the
+    server loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        node_id: str,
+        loop_bridge: LoopBridge,
+        on_elected: Optional[Callable[[], Awaitable]] = None,
+        on_demoted: Optional[Callable[[], Awaitable]] = None,
+        ttl: float = 15.0,
+        renew_interval: float = 5.0,
+    ):
+        self.name = name
+        self.node_id = node_id
+        self.loop_bridge = loop_bridge
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.is_leader = False
+        # Monotonic time our lease runs out if it is not renewed
+        self._valid_until = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+        self.elections = 0
+        self.failed_renewals = 0
+
+    def start(self):
+        """Start campaigning for the lease if not already"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name=f"leader-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop renewing and give the lease up so another worker can take over right away"""
+        with self._lock:
+            thread = self._thread
+            self._stop_event.set()
+
+        if thread and thread.is_alive():
+            thread.join(timeout=timeout)
+        if self.is_leader:
+            self.release()
+            self.is_leader = False
+
+    def _run(self):
+        while True:
+            try:
+                held = self.try_acquire()
+                if held:
+                    self._valid_until = time.monotonic() + self.ttl
+            except Exception as e:
+                logger.error(f"Failed to renew lease {self.name}: {e}")
+                self.failed_renewals += 1
+                # Still leader until the lease we hold could have expired
+                held = self.is_leader and time.monotonic() < self._valid_until
+
+            if held != self.is_leader:
+                self.is_leader = held
+                if held:
+                    self.elections += 1
+                    logger.info(f"Node {self.node_id} is now leader for {self.name}")
+                else:
+                    logger.warning(f"Node {self.node_id} lost the lease for {self.name}")
+                callback = self.on_elected if held else self.on_demoted
+                if callback:
+                    self.loop_bridge.submit(callback())
+
+            if self._stop_event.wait(self.renew_interval):
+                return
+
+    def try_acquire(self) -> bool:
+        """Renew the lease if we hold it, take it if it is free or expired, blocking"""
+        now = datetime.now(timezone.utc)
+        table = Lease.__table__
+        db = SessionLocal()
+        try:
+            result = db.execute(
+                update(table)
+                .where(table.c.name == self.name, or_(table.c.holder == self.node_id, table.c.expires_at < now))
+                .values(
+                    holder=self.node_id,
+                    acquired_at=case((table.c.holder == self.node_id, table.c.acquired_at), else_=now),
+                    expires_at=now + timedelta(seconds=self.ttl),
+                )
+            )
+            if result.rowcount == 0:
+                if db.scalar(select(table.c.holder).where(table.c.name == self.name)) is not None:
+                    db.rollback()
+                    return False
+                db.add(Lease(name=self.name, holder=self.node_id, acquired_at=now, expires_at=now + timedelta(seconds=self.ttl)))
+            db.commit()
+            return True
+        except IntegrityError:
+            # Another worker inserted the lease first
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+    def release(self):
+        db = SessionLocal()
+        try:
+            db.execute(delete(Lease).where(Lease.name == self.name, Lease.holder == self.node_id))
+            db.commit()
+        except Exception as e:
+            logger.error(f"Failed to release lease {self.name}: {e}")
+        finally:
+            db.close()
+
+    def holder(self) -> Optional[str]:
+        """Node currently holding the lease, None if it is free or expired"""
+        db = SessionLocal()
+        try:
+            return db.scalar(
+                select(Lease.holder).where(Lease.name == self.name, Lease.expires_at >= datetime.now(timezone.utc))
+            )
+        finally:
+            db.close()
+
+    def get_stats(self) -> dict:
+        return {
+            "name": self.name,
+            "node_id": self.node_id,
+            "is_leader": self.is_leader,
+            "elections": self.elections,
+            "failed_renewals": self.failed_renewals,
+        }
@@ -0,0 +1,250 @@
+import csv
+import io
+import json
+import zlib
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from database import SessionLocal, Log, Site, VisitMetric
+from log_queries import LOG_ORDER
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional, only needed for parquet/arrow exports
+    pa = None
+    pq = None
+
+# Rows fetched from the cursor and rendered per chunk sent to the client
+CHUNK_ROWS = 1000
+# Rows per Arrow record batch / Parquet row group
+COLUMNAR_BATCH_ROWS = 50000
+
+EXPORT_COLUMNS = (Log.id, Log.timestamp, Log.level, Log.action, Log.site_name, Log.message, Log.duration)
+
+METRIC_COLUMNS = (
+    VisitMetric.site_id, Site.name.label("site_name"), VisitMetric.timestamp, VisitMetric.success,
+    VisitMetric.load_time_ms, VisitMetric.dns_ms, VisitMetric.connect_ms, VisitMetric.ttfb_ms,
+    VisitMetric.dom_content_loaded_ms, VisitMetric.load_event_ms, VisitMetric.first_contentful_paint_ms,
+    VisitMetric.transfer_size
+)
+METRIC_CSV_HEADER = [column.key for column in METRIC_COLUMNS]
+
+def iter_log_rows(level: Optional[str] = None, site_name: Optional[str] = None) -> Iterator:
+    """Stream filtered log rows newest first without loading them all
+
+    Opens its own session because the response body is produced after the
+    request's dependencies have been closed.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(*EXPORT_COLUMNS)
+
+        if level:
+            query = query.filter(Log.level == level)
+
+        if site_name:
+            query = query.filter(Log.site_name == site_name)
+
+        for row in query.order_by(*LOG_ORDER).yield_per(CHUNK_ROWS):
+            yield row
+    finally:
+        db.close()
+
+def iter_visit_metric_rows(site_id: Optional[str] = None) -> Iterator:
+    """Stream visit metrics in (site_id, timestamp) key order"""
+    db = SessionLocal()
+    try:
+        query = db.query(*METRIC_COLUMNS).outerjoin(Site, Site.id == VisitMetric.site_id)
+
+        if site_id:
+            query = query.filter(VisitMetric.site_id == site_id)
+
+        for row in query.order_by(VisitMetric.site_id, VisitMetric.timestamp).yield_per(CHUNK_ROWS):
+            yield row
+    finally:
+        db.close()
+
+def _row_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "timestamp": row.timestamp.isoformat(),
+        "level": row.level,
+        "action": row.action,
+        "site_name": row.site_name,
+        "message": row.message,
+        "duration": row.duration
+    }
+
+def metric_dict(row) -> dict:
+    data = row._asdict()
+    data["timestamp"] = row.timestamp.isoformat()
+    return data
+
+def _chunks(pieces: Iterable[str]) -> Iterator[str]:
+    """Join rendered rows into chunks of CHUNK_ROWS"""
+    buffer = []
+    for piece in pieces:
+        buffer.append(piece)
+        if len(buffer) >= CHUNK_ROWS:
+            yield "".join(buffer)
+            buffer.clear()
+    if buffer:
+        yield "".join(buffer)
+
+def iter_json(rows: Iterable, to_dict: Callable = _row_dict) -> Iterator[str]:
+    """JSON array framed incrementally, one indented object per row"""
+    def pieces():
+        yield "["
+        separator = "\n"
+        for row in rows:
+            item = json.dumps(to_dict(row), indent=2).replace("\n", "\n  ")
+            yield f"{separator}  {item}"
+            separator = ",\n"
+        yield "\n]" if separator != "\n" else "]"
+    return _chunks(pieces())
+
+def iter_ndjson(rows: Iterable, to_dict: Callable = _row_dict) -> Iterator[str]:
+    """One JSON object per line"""
+    return _chunks(json.dumps(to_dict(row)) + "\n" for row in rows)
+
+LOG_CSV_HEADER = ["ID", "Timestamp", "Level", "Action", "Site Name", "Message", "Duration"]
+
+def _log_csv_values(row) -> list:
+    return [
+        row.id,
+        row.timestamp.isoformat(),
+        row.level,
+        row.action,
+        row.site_name or "",
+        row.message,
+        row.duration or ""
+    ]
+
+def metric_csv_values(row) -> list:
+    return list(metric_dict(row).values())
+
+def iter_csv(rows: Iterable, header: List[str] = LOG_CSV_HEADER, to_values: Callable = _log_csv_values) -> Iterator[str]:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(header)
+
+    count = 0
+    for row in rows:
+        writer.writerow(to_values(row))
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+
+    yield output.getvalue()
+
+def iter_txt(rows: Iterable) -> Iterator[str]:
+    def lines():
+        separator = ""
+        for row in rows:
+            site_info = f" - {row.site_name}" if row.site_name else ""
+            duration_info = f" ({row.duration}s)" if row.duration else ""
+            yield f"{separator}[{row.timestamp.isoformat()}] {row.level.upper()}{site_info}: {row.action} - {row.message}{duration_info}"
+            separator = "\n"
+    return _chunks(lines())
+
+def encode(chunks: Iterable[str], gzip: bool = False) -> Iterator[bytes]:
+    """Encode text chunks as UTF-8, optionally gzip-compressing them on the fly"""
+    if not gzip:
+        for chunk in chunks:
+            yield chunk.encode()
+        return
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 writes a gzip header
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def log_arrow_schema():
+    # Low-cardinality text columns are dictionary encoded
+    return pa.schema([
+        ("id", pa.string()),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("level", pa.dictionary(pa.int8(), pa.string())),
+        ("action", pa.dictionary(pa.int32(), pa.string())),
+        ("site_name", pa.dictionary(pa.int32(), pa.string())),
+        ("message", pa.string()),
+        ("duration", pa.float64()),
+    ])
+
+def metric_arrow_schema():
+    return pa.schema([
+        ("site_id", pa.dictionary(pa.int32(), pa.string())),
+        ("site_name", pa.dictionary(pa.int32(), pa.string())),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("success", pa.bool_()),
+        ("load_time_ms", pa.int32()),
+        ("dns_ms", pa.int32()),
+        ("connect_ms", pa.int32()),
+        ("ttfb_ms", pa.int32()),
+        ("dom_content_loaded_ms", pa.int32()),
+        ("load_event_ms", pa.int32()),
+        ("first_contentful_paint_ms", pa.int32()),
+        ("transfer_size", pa.int64()),
+    ])
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def iter_columnar(rows: Iterable, schema, format: str) -> Iterator[bytes]:
+    """Write rows as Parquet or Arrow IPC stream record batches as they come off the cursor
+
+    Timestamps from the database are naive UTC, which Arrow reads as UTC.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for parquet and arrow exports")
+
+    sink = _ChunkSink()
+    if format == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        # The stream format, unlike the file format, allows each batch its own dictionaries
+        writer = pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+
+    rows = iter(rows)
+    names = schema.names
+    while True:
+        batch_rows = list(islice(rows, COLUMNAR_BATCH_ROWS))
+        if not batch_rows:
+            break
+        columns = {name: [getattr(row, name) for row in batch_rows] for name in names}
+        writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+        data = sink.drain()
+        if data:
+            yield data
+
+    writer.close()
+    yield sink.drain()
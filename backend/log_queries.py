@@ -0,0 +1,97 @@
+import base64
+import re
+from datetime import datetime
+from typing import Tuple
+
+from sqlalchemy import column, desc, func, literal_column, or_, select, table, text, tuple_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from database import Log
+
+logs_fts = table("logs_fts", column("rowid"))
+
+# Characters and operators that mark a search as explicit FTS5 syntax
+FTS_SYNTAX = re.compile(r'["*()]|\b(AND|OR|NOT|NEAR)\b')
+
+_fts_available = None
+
+# Newest first, id breaks ties between entries logged in the same instant
+LOG_ORDER = (desc(Log.timestamp), desc(Log.id))
+
+def encode_cursor(log: Log) -> str:
+    """Opaque cursor pointing just past a log entry"""
+    raw = f"{log.timestamp.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor, raises ValueError for malformed cursors"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, log_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(timestamp), log_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def apply_cursor(query, cursor: str):
+    """Seek past the cursor instead of skipping rows with OFFSET"""
+    timestamp, log_id = decode_cursor(cursor)
+    return query.filter(tuple_(Log.timestamp, Log.id) < tuple_(timestamp, log_id))
+
+def fts_available(db: Session) -> bool:
+    """Whether the logs_fts index exists, checked once per process"""
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = db.get_bind().dialect.name == "sqlite" and db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'logs_fts'")
+        ).first() is not None
+    return _fts_available
+
+def quote_terms(search: str) -> str:
+    """Every word as a quoted prefix match, so nothing in it is read as FTS5 syntax"""
+    terms = [term.replace('"', "") for term in search.split()]
+    return " ".join(f'"{term}"*' for term in terms if term)
+
+def is_valid_fts_query(db: Session, query: str) -> bool:
+    """Whether FTS5 accepts a query, syntax errors surface even on an empty index"""
+    try:
+        db.execute(text("SELECT 1 FROM logs_fts WHERE logs_fts MATCH :query LIMIT 1"), {"query": query}).first()
+    except OperationalError:
+        return False
+    return True
+
+def to_fts_query(search: str, db: Session = None) -> str:
+    """Turn a search box string into an FTS5 query
+
+    Plain words become prefix matches that must all appear, so "time err"
+    finds "Timeout Error". Searches that already use FTS5 syntax (quoted
+    phrases, prefix *, AND/OR/NOT, NEAR) are passed through unchanged, unless
+    FTS5 rejects them, as with pasted text like "error (timeout".
+    """
+    if FTS_SYNTAX.search(search) and (db is None or is_valid_fts_query(db, search)):
+        return search
+    return quote_terms(search)
+
+def apply_search(query, db: Session, search: str, rank: bool = False):
+    """Filter logs by text search, using the FTS5 index when it exists
+
+    With rank the query is ordered by bm25 relevance, otherwise the caller
+    orders it.
+    """
+    if not fts_available(db):
+        return query.filter(
+            or_(
+                Log.message.contains(search),
+                Log.action.contains(search)
+            )
+        )
+
+    matches = (
+        select(logs_fts.c.rowid, func.bm25(literal_column("logs_fts")).label("rank"))
+        .where(literal_column("logs_fts").op("MATCH")(to_fts_query(search, db)))
+        .subquery()
+    )
+    query = query.join(matches, matches.c.rowid == literal_column("logs.rowid"))
+    if rank:
+        query = query.order_by(matches.c.rank)
+    return query
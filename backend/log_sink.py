@@ -0,0 +1,166 @@
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from database import SessionLocal, Log
+
+logger = logging.getLogger(__name__)
+
+# Queued by stop() to wake the flusher, never written
+_WAKEUP = object()
+
+class LogSink:
+    """Buffer log and metric rows in memory and write them to the database in batches"""
+
+    def __init__(self, max_queue_size: int = 10000, batch_size: int = 500, flush_interval: float = 1.0):
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+        # Counters used to size the queue and batches
+        self.enqueued_count = 0
+        self.dropped_count = 0
+        self.written_count = 0
+        self.failed_count = 0
+        self.flush_count = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def start(self):
+        """Start the background flusher if it is not running, without waiting on a stop() in progress"""
+        with self._lock:
+            thread = self._thread
+            if thread and thread.is_alive():
+                # While a stop() drains, rows queued now are written by it or by the next flusher
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+
+    def submit(self, row: Dict[str, Any], model=Log) -> bool:
+        """Queue a row for model's table without blocking, returns False if it was dropped"""
+        self.start()
+        try:
+            self.queue.put_nowait((model, row))
+        except queue.Full:
+            with self._lock:
+                self.dropped_count += 1
+            return False
+
+        with self._lock:
+            self.enqueued_count += 1
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything still queued and stop the background flusher"""
+        with self._lock:
+            thread = self._thread
+            self._stop_event.set()
+
+        # Wake the flusher if it is waiting on an empty queue
+        try:
+            self.queue.put_nowait(_WAKEUP)
+        except queue.Full:
+            pass
+
+        if thread and thread.is_alive():
+            thread.join(timeout=timeout)
+
+        # Write whatever arrived after the flusher exited
+        while True:
+            batch = self._collect(block=False)
+            if not batch:
+                break
+            self._write(batch)
+
+    def _run(self):
+        while True:
+            batch = self._collect(block=True)
+            if batch:
+                self._write(batch)
+            elif self._stop_event.is_set():
+                break
+
+    def _collect(self, block: bool) -> List[Tuple[Any, Dict[str, Any]]]:
+        """Gather up to batch_size rows, waiting at most flush_interval after the first one"""
+        batch: List[Tuple[Any, Dict[str, Any]]] = []
+        deadline = None
+
+        while len(batch) < self.batch_size:
+            try:
+                if not block or self._stop_event.is_set():
+                    row = self.queue.get_nowait()
+                elif deadline is None:
+                    row = self.queue.get(timeout=self.flush_interval)
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    row = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            if row is _WAKEUP:
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            batch.append(row)
+
+        return batch
+
+    def _write(self, rows: List[Tuple[Any, Dict[str, Any]]]):
+        """Insert a batch of rows in a single transaction, one multi-row insert per table"""
+        by_model = defaultdict(list)
+        for model, row in rows:
+            by_model[model].append(row)
+
+        start_time = time.perf_counter()
+        db = SessionLocal()
+        try:
+            for model, model_rows in by_model.items():
+                db.execute(insert(model), model_rows)
+            db.commit()
+            written = len(rows)
+            failed = 0
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to write {len(rows)} queued rows: {e}")
+            written = 0
+            failed = len(rows)
+        finally:
+            db.close()
+
+        latency = time.perf_counter() - start_time
+        with self._lock:
+            self.written_count += written
+            self.failed_count += failed
+            self.flush_count += 1
+            self.last_flush_latency = latency
+            self.total_flush_latency += latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+
+    def get_stats(self) -> dict:
+        """Get queue depth, flush latency and drop counters"""
+        with self._lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "max_queue_size": self.max_queue_size,
+                "enqueued": self.enqueued_count,
+                "written": self.written_count,
+                "dropped": self.dropped_count,
+                "failed": self.failed_count,
+                "flushes": self.flush_count,
+                "last_flush_latency_ms": round(self.last_flush_latency * 1000, 3),
+                "avg_flush_latency_ms": round(self.total_flush_latency / self.flush_count * 1000, 3) if self.flush_count else 0.0,
+                "max_flush_latency_ms": round(self.max_flush_latency * 1000, 3),
+            }
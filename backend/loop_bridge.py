@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+class LoopBridge:
+    """Hand work from worker threads to the server event loop"""
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop = None):
+        """Capture the loop that owns the websocket connections"""
+        self.loop = loop or asyncio.get_running_loop()
+
+    def is_attached(self) -> bool:
+        return self.loop is not None and not self.loop.is_closed()
+
+    def submit(self, coro: Coroutine) -> Optional[Future]:
+        """Schedule a coroutine on the server loop without waiting for it"""
+        if not self.is_attached():
+            logger.warning("Event loop not attached, dropping coroutine")
+            coro.close()
+            return None
+
+        try:
+            future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        except RuntimeError as e:
+            # Loop is shutting down
+            logger.warning(f"Failed to submit coroutine to event loop: {e}")
+            coro.close()
+            return None
+
+        future.add_done_callback(self._report_exception)
+        return future
+
+    def call_soon(self, callback: Callable[..., Any], *args) -> bool:
+        """Run a plain callback on the server loop"""
+        if not self.is_attached():
+            return False
+
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            return False
+        return True
+
+    @staticmethod
+    def _report_exception(future: Future):
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc:
+            logger.error(f"Error in coroutine submitted from worker thread: {exc}")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -55,6 +55,22 @@ class Log(LogBase):
     class Config:
         from_attributes = True
 
+class LogPage(BaseModel):
+    items: List[Log]
+    next_cursor: Optional[str] = None
+
+class LogRollup(BaseModel):
+    hour: datetime
+    site_name: str  # empty for system logs
+    level: str
+    count: int
+    duration_count: int
+    duration_sum: float
+    duration_max: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
 class SystemSettingBase(BaseModel):
     key: str
     value: str
@@ -78,6 +94,21 @@ class SystemStatus(BaseModel):
     total_clicks: int
     system_status: str
 
+class WindowStats(BaseModel):
+    visits: int
+    errors: int
+    error_rate: float
+    throughput_per_min: float
+    mean_load_time_ms: Optional[int] = None
+    p50_load_time_ms: Optional[int] = None
+    p95_load_time_ms: Optional[int] = None
+    p99_load_time_ms: Optional[int] = None
+
+class SiteStats(BaseModel):
+    site_id: str
+    site_name: str
+    windows: Dict[str, WindowStats]  # 1m, 15m, 1h
+
 class ControlCommand(BaseModel):
     action: str  # start, pause, stop
     global_interval: Optional[int] = None
@@ -86,6 +117,9 @@ class ExportFormat(str, Enum):
     txt = "txt"
     csv = "csv"
     json = "json"
+    ndjson = "ndjson"
+    parquet = "parquet"
+    arrow = "arrow"
 
 class WebSocketMessage(BaseModel):
     type: str  # log, status, error
@@ -0,0 +1,273 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import case, delete, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, engine, Log, LogRollup, VisitMetric
+from settings_cache import settings
+
+logger = logging.getLogger(__name__)
+
+LOG_LEVELS = ("info", "success", "warning", "error")
+
+class RetentionJob:
+    """Roll expired log rows up into hourly aggregates and prune them in small batches
+
+    Each batch is its own short transaction so the log sink and API writes are
+    never locked out for long. Pages freed by the deletes are handed back to the
+    filesystem with incremental VACUUM.
+    """
+
+    def __init__(
+        self,
+        interval: float = 3600.0,
+        batch_size: int = 1000,
+        batch_pause: float = 0.05,
+        vacuum_pages: int = 2000,
+        initial_delay: float = 60.0,
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause  # seconds between batches for other writers to get in
+        self.vacuum_pages = vacuum_pages  # pages released per incremental VACUUM step
+        self.initial_delay = initial_delay
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._run_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        self.runs = 0
+        self.logs_pruned = 0
+        self.metrics_pruned = 0
+        self.pages_freed = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_duration = 0.0
+
+    def start(self):
+        """Start the periodic background job"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="log-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop after the batch in progress"""
+        with self._lock:
+            thread = self._thread
+            self._stop_event.set()
+
+        if thread and thread.is_alive():
+            thread.join(timeout=timeout)
+
+    def _run(self):
+        delay = self.initial_delay
+        while not self._stop_event.wait(delay):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Log retention run failed: {e}")
+            delay = self.interval
+
+    def run_once(self) -> Dict[str, int]:
+        """Apply the configured TTLs once and return what was pruned"""
+        with self._run_lock:
+            start_time = time.perf_counter()
+            now = datetime.now(timezone.utc)
+
+            log_ttls = {level: settings.get(f"log_retention_{level}_days", 0.0) for level in LOG_LEVELS}
+            metric_ttl = settings.get("visit_metric_retention_days", 0.0)
+
+            logs_pruned = 0
+            for level, days in log_ttls.items():
+                if days > 0:
+                    logs_pruned += self._prune_logs(level, now - timedelta(days=days))
+
+            metrics_pruned = 0
+            if metric_ttl > 0:
+                metrics_pruned = self._prune_metrics(now - timedelta(days=metric_ttl))
+
+            pages_freed = self._vacuum() if logs_pruned or metrics_pruned else 0
+
+            duration = time.perf_counter() - start_time
+            with self._lock:
+                self.runs += 1
+                self.logs_pruned += logs_pruned
+                self.metrics_pruned += metrics_pruned
+                self.pages_freed += pages_freed
+                self.last_run_at = now
+                self.last_run_duration = duration
+
+            if logs_pruned or metrics_pruned:
+                logger.info(
+                    f"Retention pruned {logs_pruned} logs and {metrics_pruned} visit metrics, "
+                    f"freed {pages_freed} pages in {duration:.1f}s"
+                )
+            return {"logs_pruned": logs_pruned, "metrics_pruned": metrics_pruned, "pages_freed": pages_freed}
+
+    def _prune_logs(self, level: str, cutoff: datetime) -> int:
+        """Roll up and delete log rows of one level older than cutoff, oldest first"""
+        total = 0
+        while not self._stop_event.is_set():
+            db = SessionLocal()
+            try:
+                rows = (
+                    db.query(Log.id, Log.timestamp, Log.site_name, Log.duration)
+                    .filter(Log.level == level, Log.timestamp < cutoff)
+                    .order_by(Log.timestamp)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+
+                # Rollup and delete commit together, so no row is counted twice or lost
+                self._add_rollups(db, level, rows)
+                db.execute(delete(Log).where(Log.id.in_([row.id for row in rows])))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to prune {level} logs: {e}")
+                break
+            finally:
+                db.close()
+
+            total += len(rows)
+            if len(rows) < self.batch_size:
+                break
+            self._stop_event.wait(self.batch_pause)
+        return total
+
+    def _add_rollups(self, db: Session, level: str, rows):
+        """Merge a batch of log rows into the hourly rollup table"""
+        groups = defaultdict(lambda: {"count": 0, "duration_count": 0, "duration_sum": 0.0, "duration_max": None})
+        for row in rows:
+            group = groups[(row.timestamp.replace(minute=0, second=0, microsecond=0), row.site_name or "")]
+            group["count"] += 1
+            if row.duration is not None:
+                group["duration_count"] += 1
+                group["duration_sum"] += row.duration
+                if group["duration_max"] is None or row.duration > group["duration_max"]:
+                    group["duration_max"] = row.duration
+
+        values = [
+            {"hour": hour, "site_name": site_name, "level": level, **group}
+            for (hour, site_name), group in groups.items()
+        ]
+        dialect = engine.dialect.name
+        if dialect in ("mysql", "mariadb"):
+            statement = mysql_insert(LogRollup).values(values)
+            statement = statement.on_duplicate_key_update(self._merge_rollup(statement.inserted))
+        elif dialect in ("sqlite", "postgresql"):
+            insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+            statement = insert(LogRollup).values(values)
+            statement = statement.on_conflict_do_update(
+                index_elements=[LogRollup.hour, LogRollup.site_name, LogRollup.level],
+                set_=self._merge_rollup(statement.excluded),
+            )
+        else:
+            raise RuntimeError(f"Log rollups are not supported on {dialect} databases")
+        db.execute(statement)
+
+    @staticmethod
+    def _merge_rollup(new) -> dict:
+        """Column updates adding the new counts to an existing rollup row"""
+        return {
+            "count": LogRollup.count + new.count,
+            "duration_count": LogRollup.duration_count + new.duration_count,
+            "duration_sum": LogRollup.duration_sum + new.duration_sum,
+            "duration_max": case(
+                (new.duration_max > LogRollup.duration_max, new.duration_max),
+                else_=func.coalesce(LogRollup.duration_max, new.duration_max),
+            ),
+        }
+
+    def _prune_metrics(self, cutoff: datetime) -> int:
+        """Delete visit metrics older than cutoff, site by site along the primary key"""
+        db = SessionLocal()
+        try:
+            site_ids = [site_id for (site_id,) in db.query(VisitMetric.site_id).distinct()]
+        finally:
+            db.close()
+
+        total = 0
+        for site_id in site_ids:
+            while not self._stop_event.is_set():
+                db = SessionLocal()
+                try:
+                    expired = (
+                        db.query(VisitMetric.timestamp)
+                        .filter(VisitMetric.site_id == site_id, VisitMetric.timestamp < cutoff)
+                        .order_by(VisitMetric.timestamp)
+                        .limit(self.batch_size)
+                        .subquery()
+                    )
+                    result = db.execute(
+                        delete(VisitMetric)
+                        .where(VisitMetric.site_id == site_id, VisitMetric.timestamp.in_(expired.select()))
+                        .execution_options(synchronize_session=False)
+                    )
+                    db.commit()
+                    deleted = result.rowcount
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Failed to prune visit metrics for site {site_id}: {e}")
+                    break
+                finally:
+                    db.close()
+
+                total += deleted
+                if deleted < self.batch_size:
+                    break
+                self._stop_event.wait(self.batch_pause)
+        return total
+
+    def _vacuum(self) -> int:
+        """Release free pages to the filesystem a few at a time"""
+        if engine.dialect.name != "sqlite":
+            return 0
+
+        freed = 0
+        while not self._stop_event.is_set():
+            connection = engine.raw_connection()
+            try:
+                free_pages = connection.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free_pages or connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                    break
+                pages = min(free_pages, self.vacuum_pages)
+                # The pragma frees one page per step and execute() only steps once,
+                # executescript() runs it to completion
+                connection.driver_connection.executescript(f"PRAGMA incremental_vacuum({pages});")
+            finally:
+                connection.close()
+            freed += pages
+            self._stop_event.wait(self.batch_pause)
+        
+        if freed:
+            # In WAL mode the file only shrinks once the vacuumed pages are checkpointed
+            connection = engine.raw_connection()
+            try:
+                connection.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+            finally:
+                connection.close()
+        return freed
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "logs_pruned": self.logs_pruned,
+                "metrics_pruned": self.metrics_pruned,
+                "pages_freed": self.pages_freed,
+                "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+                "last_run_seconds": round(self.last_run_duration, 3),
+            }
@@ -0,0 +1,239 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+class SiteScheduler:
+    """Dispatch due site visits from a single timer thread to a bounded worker pool
+
+    Due times are spread over a timer wheel whose slot width is the average visit
+    time divided by the worker count, so visits do not align into bursts. A visit
+    is only moved within its slack (max_shift of its interval), which bounds how
+    late any site can be.
+    """
+
+    def __init__(
+        self,
+        executor: ThreadPoolExecutor,
+        max_workers: int,
+        run_job: Callable[[str], Optional[float]],
+        jitter: float = 0.1,
+        max_shift: float = 0.25,
+    ):
+        # run_job(site_id) performs one visit and returns the interval until the next one
+        self.executor = executor
+        self.max_workers = max_workers
+        self.run_job = run_job
+        self.jitter = jitter
+        self.max_shift = max_shift
+
+        self._heap: List[Tuple[float, int, str, int, int]] = []
+        self._slot_counts: Dict[int, int] = {}
+        self._avg_visit_time = 1.0
+        self._versions: Dict[str, int] = {}
+        self._running: Set[str] = set()
+        self._deferred: Set[str] = set()
+        self._seq = itertools.count()
+        self._workers = threading.Semaphore(max_workers)
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = True
+        self._paused = False
+
+    def start(self):
+        """Start the dispatcher thread"""
+        with self._cond:
+            if not self._stopped:
+                return
+            self._stopped = False
+            self._paused = False
+            self._thread = threading.Thread(target=self._run, name="site-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop dispatching, drop all jobs and wait for running visits to finish"""
+        with self._cond:
+            self._stopped = True
+            self._heap.clear()
+            self._slot_counts.clear()
+            self._versions.clear()
+            self._deferred.clear()
+            self._cond.notify_all()
+            thread = self._thread
+
+        if thread:
+            thread.join(timeout=timeout)
+
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"{len(self._running)} site visits still running after stop")
+                    break
+                self._cond.wait(remaining)
+
+    def pause(self):
+        with self._cond:
+            self._paused = True
+
+    def resume(self):
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    def schedule(self, site_id: str, delay: float = 0.0, slack: float = 0.0):
+        """Add a site or move its next visit, replacing any pending entry
+
+        The visit may be pushed back by up to slack seconds to avoid bursts.
+        """
+        with self._cond:
+            version = self._versions.get(site_id, 0) + 1
+            self._versions[site_id] = version
+            self._push(site_id, version, time.monotonic() + delay, slack)
+
+    def remove(self, site_id: str):
+        """Stop scheduling a site, a visit already running is allowed to finish"""
+        with self._cond:
+            self._versions.pop(site_id, None)
+            self._cond.notify_all()
+
+    def is_scheduled(self, site_id: str) -> bool:
+        with self._cond:
+            return site_id in self._versions
+
+    def _push(self, site_id: str, version: int, due: float, slack: float = 0.0):
+        due, slot = self._place(due, slack)
+        heapq.heappush(self._heap, (due, next(self._seq), site_id, version, slot))
+        self._cond.notify_all()
+
+    def _slot_width(self) -> float:
+        # Spacing between dispatches that keeps every worker busy without queueing
+        return max(self._avg_visit_time / self.max_workers, 0.05)
+
+    def _place(self, due: float, slack: float) -> Tuple[float, int]:
+        """Move a due time to the first free wheel slot within its slack"""
+        width = self._slot_width()
+        first = int(due / width)
+        last = int((due + max(slack, 0.0)) / width)
+        step = max(1, (last - first) // 1000)
+
+        best = first
+        for slot in range(first, last + 1, step):
+            count = self._slot_counts.get(slot, 0)
+            if count == 0:
+                best = slot
+                break
+            if count < self._slot_counts.get(best, 0):
+                best = slot
+
+        self._slot_counts[best] = self._slot_counts.get(best, 0) + 1
+        return max(due, best * width), best
+
+    def _pop(self) -> Tuple[float, int, str, int, int]:
+        entry = heapq.heappop(self._heap)
+        slot = entry[4]
+        count = self._slot_counts.get(slot, 0) - 1
+        if count > 0:
+            self._slot_counts[slot] = count
+        else:
+            self._slot_counts.pop(slot, None)
+        return entry
+
+    def _next_interval(self, interval: float) -> Tuple[float, float]:
+        """Apply jitter to an interval and return it with the slack it may be shifted by"""
+        if self.jitter:
+            interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        return interval, interval * self.max_shift
+
+    def _next_due(self) -> Optional[Tuple[float, int, str, int, int]]:
+        """Wait for the next current entry to become due, None once stopped"""
+        with self._cond:
+            # A dispatcher left over from before a restart exits here
+            while not self._stopped and self._thread is threading.current_thread():
+                # Drop entries for removed or rescheduled sites
+                while self._heap and self._versions.get(self._heap[0][2]) != self._heap[0][3]:
+                    self._pop()
+
+                if self._paused or not self._heap:
+                    self._cond.wait()
+                    continue
+
+                wait = self._heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+
+                entry = self._pop()
+                site_id = entry[2]
+                if site_id in self._running:
+                    # Previous visit still running, it dispatches this one when done
+                    self._deferred.add(site_id)
+                    continue
+                self._running.add(site_id)
+                return entry
+            return None
+
+    def _run(self):
+        while True:
+            # Only take the next due visit once a worker is free
+            self._workers.acquire()
+            entry = self._next_due()
+            if entry is None:
+                self._workers.release()
+                return
+            _, _, site_id, version, _ = entry
+            try:
+                self.executor.submit(self._execute, site_id, version)
+            except RuntimeError as e:
+                logger.error(f"Failed to dispatch visit for site {site_id}: {e}")
+                self._finish(site_id, version, None)
+
+    def _execute(self, site_id: str, version: int):
+        interval = None
+        start_time = time.monotonic()
+        try:
+            interval = self.run_job(site_id)
+        except Exception as e:
+            logger.error(f"Scheduled visit for site {site_id} failed: {e}")
+        finally:
+            elapsed = time.monotonic() - start_time
+            self._finish(site_id, version, interval, elapsed)
+
+    def _finish(self, site_id: str, version: int, interval: Optional[float], elapsed: float = None):
+        with self._cond:
+            if elapsed is not None:
+                self._avg_visit_time = 0.8 * self._avg_visit_time + 0.2 * elapsed
+            self._running.discard(site_id)
+            current = self._versions.get(site_id)
+            if current is not None and not self._stopped:
+                if site_id in self._deferred:
+                    self._push(site_id, current, time.monotonic())
+                elif current == version and interval is None:
+                    # The job asked not to be run again
+                    del self._versions[site_id]
+                elif current == version:
+                    delay, slack = self._next_interval(interval)
+                    self._push(site_id, version, time.monotonic() + delay, slack)
+            self._deferred.discard(site_id)
+            self._cond.notify_all()
+        self._workers.release()
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            pending = [entry for entry in self._heap if self._versions.get(entry[2]) == entry[3]]
+            return {
+                "scheduled_sites": len(self._versions),
+                "running_visits": len(self._running),
+                "max_workers": self.max_workers,
+                "avg_visit_time": round(self._avg_visit_time, 3),
+                "next_due_in": round(max(min(entry[0] for entry in pending) - now, 0.0), 3) if pending else None,
+                "paused": self._paused,
+            }
@@ -2,31 +2,44 @@ from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, WebSocket
 from fastapi.responses import FileResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+import asyncio
 import os
+import time
 import logging
 import uuid
 import json
-import csv
 import io
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Union
 from pathlib import Path
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, asc, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, desc, func, select
+from sqlalchemy.exc import OperationalError
 
 # Import our modules
 from database import (
-    get_db, create_tables, init_system_settings, 
-    Site, Log, SystemSettings, get_setting, update_setting
+    get_db, get_async_db, bootstrap_database, async_engine, AsyncSessionLocal,
+    Site, Log, LogRollup, SiteLease, Worker
 )
 from models import (
     SiteCreate, SiteUpdate, Site as SiteSchema, 
-    LogCreate, Log as LogSchema, LogLevel,
-    SystemStatus, ControlCommand, ExportFormat,
+    LogCreate, Log as LogSchema, LogPage, LogLevel, LogRollup as LogRollupSchema,
+    SystemStatus, SiteStats, ControlCommand, ExportFormat,
     BulkSiteImport, SystemSettingUpdate
 )
 from automation_engine import AutomationEngine
 from websocket_manager import manager as websocket_manager
+from event_bus import event_bus
+from retention import RetentionJob
+from backplane import create_backplane, make_node_id
+from leader import LeaderElection
+from settings_cache import settings
+from encoders import EncodedJSONResponse, model_dicts
+from log_queries import LOG_ORDER, encode_cursor, apply_cursor, apply_search
+from log_export import (
+    iter_log_rows, iter_visit_metric_rows, iter_json, iter_ndjson, iter_csv, iter_txt, iter_columnar, encode,
+    log_arrow_schema, metric_arrow_schema, metric_dict, metric_csv_values, METRIC_CSV_HEADER, pa
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -42,14 +55,148 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="AutoClick Backend API",
     description="Backend API for the AutoClick web automation system",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=EncodedJSONResponse
 )
 
 # Create router with /api prefix
 api_router = APIRouter(prefix="/api")
 
 # Initialize automation engine
-automation_engine = AutomationEngine(websocket_manager)
+automation_engine = AutomationEngine(websocket_manager, event_bus)
+
+# Background log retention, TTLs are read from system settings on every run
+retention_job = RetentionJob(interval=float(os.environ.get('LOG_RETENTION_INTERVAL', '3600')))
+
+# Fan-out between uvicorn workers, BACKPLANE_URL is empty for a single worker
+node_id = make_node_id()
+backplane = create_backplane(os.environ.get('BACKPLANE_URL', ''), node_id)
+event_bus.backplane = backplane
+websocket_manager.backplane = backplane
+
+# Sites run on engine nodes (engine_node.py), API workers only store the state requested for them
+ENGINE_NODES = os.environ.get('ENGINE_NODES', '').lower() in ('1', 'true', 'yes')
+
+async def on_engine_elected():
+    """This worker runs the engine and the retention job from now on"""
+    retention_job.start()
+    if ENGINE_NODES:
+        return
+    automation_engine.is_leader = True
+    # Take over the visits the previous leader recorded since the last refresh
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(automation_engine.site_stats.rebuild)
+    # Carry on where a previous leader that went away left off
+    if settings.get("system_status") == "running":
+        await automation_engine.start()
+    await automation_engine.broadcast_status()
+
+async def on_engine_demoted():
+    automation_engine.is_leader = False
+    await automation_engine.stop(persist=False)
+    await asyncio.to_thread(retention_job.stop)
+
+# With several workers one of them, elected through the leases table, runs the engine
+engine_lease_ttl = float(os.environ.get('ENGINE_LEASE_TTL', '15'))
+engine_leader = LeaderElection(
+    "engine",
+    node_id,
+    automation_engine.loop_bridge,
+    on_elected=on_engine_elected,
+    on_demoted=on_engine_demoted,
+    ttl=engine_lease_ttl,
+    renew_interval=engine_lease_ttl / 3
+)
+
+ENGINE_COMMANDS = {
+    "start": automation_engine.start,
+    "pause": automation_engine.pause,
+    "stop": automation_engine.stop,
+    "status": automation_engine.broadcast_status,
+}
+
+async def on_backplane_event(channel: str, payload: dict):
+    """Handle what another worker published"""
+    if channel == "event":
+        await event_bus.deliver(payload["topic"], payload["payload"])
+    elif channel == "ws":
+        if payload.get("type") == "status" and not automation_engine.is_leader:
+            automation_engine.on_leader_status(payload.get("data", {}))
+        await websocket_manager.deliver(payload)
+    elif channel == "engine" and automation_engine.is_leader:
+        command = ENGINE_COMMANDS.get(payload.get("command"))
+        if command:
+            await command()
+
+def mirror_requested_state():
+    """Report the state engine nodes were asked to be in as the engine status"""
+    automation_engine.on_leader_status({
+        "is_running": settings.get("system_status") == "running",
+        "is_paused": settings.get("is_paused", False)
+    })
+
+async def on_requested_state_changed(topic: str, payload: dict):
+    if ENGINE_NODES and payload["key"] in ("system_status", "is_paused"):
+        mirror_requested_state()
+
+event_bus.subscribe("setting.changed", on_requested_state_changed)
+
+async def request_node_state(command: str):
+    """Store the state engine nodes should follow"""
+    values = {
+        "start": {"system_status": "running", "is_paused": "false"},
+        "stop": {"system_status": "stopped", "is_paused": "false"},
+        "pause": {"is_paused": "false" if settings.get("is_paused", False) else "true"},
+    }[command]
+    async with AsyncSessionLocal() as db:
+        for key, value in values.items():
+            await settings.update(db, key, value)
+
+async def forward_to_leader(command: str) -> Optional[Response]:
+    """Send an engine command to the leader worker or the engine nodes, None when this worker runs the engine"""
+    if ENGINE_NODES:
+        await request_node_state(command)
+        target = "engine nodes"
+    elif automation_engine.is_leader:
+        return None
+    else:
+        await backplane.publish("engine", {"command": command})
+        target = "engine leader"
+    return EncodedJSONResponse(
+        {"message": f"Automation {command} sent to the {target}", "status": "requested"},
+        status_code=202
+    )
+
+# Workers that do not run the engine reload site statistics from visit metrics once they are this old
+SITE_STATS_TTL = float(os.environ.get('SITE_STATS_TTL', '10'))
+site_stats_lock = asyncio.Lock()
+
+async def refresh_site_stats(db: AsyncSession):
+    """Reload site statistics on followers and with ENGINE_NODES, only the engine that visits a site records it as it happens"""
+    if automation_engine.is_leader:
+        return
+    async with site_stats_lock:
+        if time.monotonic() - automation_engine.site_stats.rebuilt_at >= SITE_STATS_TTL:
+            await db.run_sync(automation_engine.site_stats.rebuild)
+
+def validate_site_timing(duration: Optional[int], interval: Optional[int]):
+    """Reject durations and intervals the scheduler cannot run, None leaves a field unchecked"""
+    if duration is not None and (duration < 1 or duration > 300):
+        raise HTTPException(status_code=400, detail="Duration must be between 1 and 300 seconds")
+    
+    if interval is not None and (interval < 1 or interval > 3600):
+        raise HTTPException(status_code=400, detail="Interval must be between 1 and 3600 seconds")
+
+def site_event_payload(site: Site) -> dict:
+    """Site fields published on the event bus after a change"""
+    return {
+        "id": site.id,
+        "name": site.name,
+        "url": site.url,
+        "duration": site.duration,
+        "interval": site.interval,
+        "is_active": site.is_active
+    }
 
 # CORS middleware
 app.add_middleware(
@@ -65,15 +212,34 @@ app.add_middleware(
 async def startup_event():
     """Initialize database and system settings"""
     try:
-        # Create tables
-        create_tables()
+        # Capture the server loop for the engine's worker threads
+        automation_engine.loop_bridge.attach()
+        
+        # Create tables and default settings, one worker at a time
+        bootstrap_database()
         logger.info("Database tables created successfully")
         
-        # Initialize system settings
         db = next(get_db())
-        init_system_settings(db)
+        settings.load(db)
         logger.info("System settings initialized")
         
+        # Rebuild rolling site statistics from persisted visit metrics
+        visit_count = automation_engine.site_stats.rebuild(db)
+        logger.info(f"Site statistics rebuilt from {visit_count} visits")
+        
+        await backplane.start(on_backplane_event)
+        if ENGINE_NODES:
+            automation_engine.is_leader = False
+            mirror_requested_state()
+        if backplane.is_distributed:
+            # Followers serve the API, the elected worker also runs the engine
+            automation_engine.is_leader = False
+            engine_leader.start()
+            if not ENGINE_NODES:
+                await backplane.publish("engine", {"command": "status"})
+        else:
+            retention_job.start()
+        
         # Log system startup
         startup_log = Log(
             id=str(uuid.uuid4()),
@@ -95,16 +261,35 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean shutdown"""
-    await automation_engine.stop()
+    # Other workers keep the engine running after this one goes
+    await automation_engine.stop(persist=not backplane.is_distributed)
+    await asyncio.to_thread(engine_leader.stop)
+    retention_job.stop()
+    automation_engine.click_counter.stop()
+    automation_engine.log_sink.stop()
+    automation_engine.browser_pool.shutdown()
+    await backplane.stop()
+    await async_engine.dispose()
     logger.info("AutoClick backend shut down")
 
 # ============== WEBSOCKET ENDPOINT ==============
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, client_id: Optional[str] = None):
-    await websocket_manager.connect(websocket, client_id)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    client_id: Optional[str] = None,
+    channels: Optional[str] = None,
+    batch: bool = False
+):
+    # channels=status,log:Site A subscribes up front, same as a subscribe message
+    # batch=true sends messages in {"type": "batch", "data": [...]} frames every WS_BATCH_WINDOW_MS
+    await websocket_manager.connect(websocket, client_id, channels.split(",") if channels else None, batch)
     try:
         while True:
-            data = await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            # Text frames, or bytes from clients on a binary subprotocol
+            data = message.get("text") if message.get("text") is not None else message.get("bytes")
             await websocket_manager.handle_client_message(websocket, data)
     except WebSocketDisconnect:
         websocket_manager.disconnect(websocket)
@@ -112,9 +297,9 @@ async def websocket_endpoint(websocket: WebSocket, client_id: Optional[str] = No
 # ============== SITE MANAGEMENT ENDPOINTS ==============
 
 @api_router.get("/sites/export")
-async def export_sites(db: Session = Depends(get_db)):
+async def export_sites(db: AsyncSession = Depends(get_async_db)):
     """Export all sites configuration"""
-    sites = db.query(Site).all()
+    sites = (await db.scalars(select(Site))).all()
     
     data = [
         {
@@ -136,21 +321,36 @@ async def export_sites(db: Session = Depends(get_db)):
     )
 
 @api_router.get("/sites", response_model=List[SiteSchema])
-async def get_sites(db: Session = Depends(get_db)):
+async def get_sites(db: AsyncSession = Depends(get_async_db)):
     """Get all sites"""
-    sites = db.query(Site).order_by(desc(Site.created_at)).all()
-    return sites
+    sites = (await db.scalars(select(Site).order_by(desc(Site.created_at)))).all()
+    # Rows already have the schema's types, skip validating each one
+    return EncodedJSONResponse(model_dicts(sites, SiteSchema))
 
 @api_router.get("/sites/{site_id}", response_model=SiteSchema)
-async def get_site(site_id: str, db: Session = Depends(get_db)):
+async def get_site(site_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get a specific site"""
-    site = db.query(Site).filter(Site.id == site_id).first()
+    site = await db.get(Site, site_id)
     if not site:
         raise HTTPException(status_code=404, detail="Site not found")
     return site
 
+@api_router.get("/sites/{site_id}/stats", response_model=SiteStats)
+async def get_site_stats(site_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Get rolling load time percentiles, error rate and throughput for a site"""
+    site = await db.get(Site, site_id)
+    if not site:
+        raise HTTPException(status_code=404, detail="Site not found")
+    
+    await refresh_site_stats(db)
+    return SiteStats(
+        site_id=site.id,
+        site_name=site.name,
+        windows=automation_engine.site_stats.get_stats(site.id)
+    )
+
 @api_router.post("/sites", response_model=SiteSchema)
-async def create_site(site: SiteCreate, db: Session = Depends(get_db)):
+async def create_site(site: SiteCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new site"""
     # Validate input data
     if not site.name or not site.name.strip():
@@ -163,22 +363,17 @@ async def create_site(site: SiteCreate, db: Session = Depends(get_db)):
     if not site.url.startswith(('http://', 'https://')):
         raise HTTPException(status_code=400, detail="URL must start with http:// or https://")
     
-    # Validate duration and interval
-    if site.duration < 1 or site.duration > 300:
-        raise HTTPException(status_code=400, detail="Duration must be between 1 and 300 seconds")
-    
-    if site.interval < 1 or site.interval > 3600:
-        raise HTTPException(status_code=400, detail="Interval must be between 1 and 3600 seconds")
+    validate_site_timing(site.duration, site.interval)
     
     # Check if we've reached the maximum number of sites
-    max_sites = int(get_setting(db, "max_sites") or "10")
-    current_count = db.query(Site).count()
+    max_sites = settings.get("max_sites", 10)
+    current_count = await db.scalar(select(func.count()).select_from(Site))
     
     if current_count >= max_sites:
         raise HTTPException(status_code=400, detail=f"Maximum number of sites ({max_sites}) reached")
     
     # Check if URL already exists
-    existing_site = db.query(Site).filter(Site.url == site.url).first()
+    existing_site = await db.scalar(select(Site).where(Site.url == site.url).limit(1))
     if existing_site:
         raise HTTPException(status_code=400, detail="Site with this URL already exists")
     
@@ -195,8 +390,8 @@ async def create_site(site: SiteCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_site)
-    db.commit()
-    db.refresh(db_site)
+    await db.commit()
+    await db.refresh(db_site)
     
     # Log the creation
     log_entry = Log(
@@ -209,7 +404,9 @@ async def create_site(site: SiteCreate, db: Session = Depends(get_db)):
         created_at=datetime.now(timezone.utc)
     )
     db.add(log_entry)
-    db.commit()
+    await db.commit()
+    
+    await event_bus.publish("site.created", site_event_payload(db_site))
     
     # Broadcast to websockets
     await websocket_manager.broadcast({
@@ -227,20 +424,22 @@ async def create_site(site: SiteCreate, db: Session = Depends(get_db)):
     return db_site
 
 @api_router.put("/sites/{site_id}", response_model=SiteSchema)
-async def update_site(site_id: str, site_update: SiteUpdate, db: Session = Depends(get_db)):
+async def update_site(site_id: str, site_update: SiteUpdate, db: AsyncSession = Depends(get_async_db)):
     """Update a site"""
-    db_site = db.query(Site).filter(Site.id == site_id).first()
+    db_site = await db.get(Site, site_id)
     if not db_site:
         raise HTTPException(status_code=404, detail="Site not found")
     
+    validate_site_timing(site_update.duration, site_update.interval)
+    
     # Update fields
     update_data = site_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_site, field, value)
     
     db_site.updated_at = datetime.now(timezone.utc)
-    db.commit()
-    db.refresh(db_site)
+    await db.commit()
+    await db.refresh(db_site)
     
     # Log the update
     log_entry = Log(
@@ -253,7 +452,9 @@ async def update_site(site_id: str, site_update: SiteUpdate, db: Session = Depen
         created_at=datetime.now(timezone.utc)
     )
     db.add(log_entry)
-    db.commit()
+    await db.commit()
+    
+    await event_bus.publish("site.updated", site_event_payload(db_site))
     
     # Broadcast to websockets
     await websocket_manager.broadcast({
@@ -271,15 +472,15 @@ async def update_site(site_id: str, site_update: SiteUpdate, db: Session = Depen
     return db_site
 
 @api_router.delete("/sites/{site_id}")
-async def delete_site(site_id: str, db: Session = Depends(get_db)):
+async def delete_site(site_id: str, db: AsyncSession = Depends(get_async_db)):
     """Delete a site"""
-    db_site = db.query(Site).filter(Site.id == site_id).first()
+    db_site = await db.get(Site, site_id)
     if not db_site:
         raise HTTPException(status_code=404, detail="Site not found")
     
     site_name = db_site.name
-    db.delete(db_site)
-    db.commit()
+    await db.delete(db_site)
+    await db.commit()
     
     # Log the deletion
     log_entry = Log(
@@ -292,7 +493,9 @@ async def delete_site(site_id: str, db: Session = Depends(get_db)):
         created_at=datetime.now(timezone.utc)
     )
     db.add(log_entry)
-    db.commit()
+    await db.commit()
+    
+    await event_bus.publish("site.deleted", {"id": site_id, "name": site_name})
     
     # Broadcast to websockets
     await websocket_manager.broadcast({
@@ -306,15 +509,15 @@ async def delete_site(site_id: str, db: Session = Depends(get_db)):
     return {"message": "Site deleted successfully"}
 
 @api_router.post("/sites/{site_id}/toggle")
-async def toggle_site(site_id: str, db: Session = Depends(get_db)):
+async def toggle_site(site_id: str, db: AsyncSession = Depends(get_async_db)):
     """Toggle site active status"""
-    db_site = db.query(Site).filter(Site.id == site_id).first()
+    db_site = await db.get(Site, site_id)
     if not db_site:
         raise HTTPException(status_code=404, detail="Site not found")
     
     db_site.is_active = not db_site.is_active
     db_site.updated_at = datetime.now(timezone.utc)
-    db.commit()
+    await db.commit()
     
     status = "activated" if db_site.is_active else "deactivated"
     log_entry = Log(
@@ -327,13 +530,16 @@ async def toggle_site(site_id: str, db: Session = Depends(get_db)):
         created_at=datetime.now(timezone.utc)
     )
     db.add(log_entry)
-    db.commit()
+    await db.commit()
+    
+    await event_bus.publish("site.toggled", site_event_payload(db_site))
     
     # Broadcast to websockets
     await websocket_manager.broadcast({
         "type": "site_toggled",
         "data": {
             "site_id": site_id,
+            "site_name": db_site.name,
             "is_active": db_site.is_active
         }
     })
@@ -343,8 +549,11 @@ async def toggle_site(site_id: str, db: Session = Depends(get_db)):
 # ============== CONTROL ENDPOINTS ==============
 
 @api_router.post("/control/start")
-async def start_automation(db: Session = Depends(get_db)):
+async def start_automation():
     """Start the automation system"""
+    forwarded = await forward_to_leader("start")
+    if forwarded:
+        return forwarded
     success = await automation_engine.start()
     if success:
         return {"message": "Automation started successfully", "status": "running"}
@@ -354,6 +563,9 @@ async def start_automation(db: Session = Depends(get_db)):
 @api_router.post("/control/pause")
 async def pause_automation():
     """Pause/resume the automation system"""
+    forwarded = await forward_to_leader("pause")
+    if forwarded:
+        return forwarded
     success = await automation_engine.pause()
     if success:
         status = "paused" if automation_engine.is_paused else "running"
@@ -364,6 +576,9 @@ async def pause_automation():
 @api_router.post("/control/stop")
 async def stop_automation():
     """Stop the automation system"""
+    forwarded = await forward_to_leader("stop")
+    if forwarded:
+        return forwarded
     success = await automation_engine.stop()
     if success:
         return {"message": "Automation stopped successfully", "status": "stopped"}
@@ -371,15 +586,14 @@ async def stop_automation():
         raise HTTPException(status_code=400, detail="Failed to stop automation")
 
 @api_router.get("/status", response_model=SystemStatus)
-async def get_system_status(db: Session = Depends(get_db)):
-    """Get system status"""
+async def get_system_status():
+    """Get system status, served from the status cache"""
     engine_status = await automation_engine.get_status()
-    global_interval = int(get_setting(db, "global_interval") or "10")
     
     return SystemStatus(
         is_running=engine_status["is_running"],
         is_paused=engine_status["is_paused"],
-        global_interval=global_interval,
+        global_interval=engine_status["global_interval"],
         active_sites_count=engine_status["active_sites_count"],
         total_sites_count=engine_status["total_sites_count"],
         total_clicks=engine_status["total_clicks"],
@@ -388,17 +602,30 @@ async def get_system_status(db: Session = Depends(get_db)):
 
 # ============== LOGS ENDPOINTS ==============
 
-@api_router.get("/logs", response_model=List[LogSchema])
+# Columnar export formats and their media types
+COLUMNAR_FORMATS = {
+    ExportFormat.parquet: "application/vnd.apache.parquet",
+    ExportFormat.arrow: "application/vnd.apache.arrow.stream"
+}
+
+@api_router.get("/logs", response_model=Union[List[LogSchema], LogPage])
 async def get_logs(
     level: Optional[str] = Query(None, description="Filter by log level"),
     site_name: Optional[str] = Query(None, description="Filter by site name"),
-    search: Optional[str] = Query(None, description="Search in message and action"),
+    search: Optional[str] = Query(None, description="Full-text search in message, action and site name, supports \"phrases\" and prefix*"),
+    sort: str = Query("timestamp", pattern="^(timestamp|relevance)$", description="Order by newest first or by search relevance"),
     limit: int = Query(100, ge=1, le=1000, description="Number of logs to return"),
     offset: int = Query(0, ge=0, description="Number of logs to skip"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor, empty for the first page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get logs with optional filtering"""
-    query = db.query(Log)
+    """Get logs with optional filtering
+
+    Without a cursor this returns a plain list paged with offset. Passing a
+    cursor (empty for the first page) switches to keyset pagination and
+    returns {items, next_cursor}.
+    """
+    query = select(Log)
     
     if level:
         query = query.filter(Log.level == level)
@@ -406,23 +633,42 @@ async def get_logs(
     if site_name:
         query = query.filter(Log.site_name == site_name)
     
+    rank = sort == "relevance"
+    if rank and not search:
+        raise HTTPException(status_code=400, detail="Relevance sort requires a search")
+    if rank and cursor is not None:
+        raise HTTPException(status_code=400, detail="Cursor pagination requires sort=timestamp")
+    
     if search:
-        query = query.filter(
-            or_(
-                Log.message.contains(search),
-                Log.action.contains(search)
-            )
-        )
+        query = await db.run_sync(lambda session: apply_search(query, session, search, rank))
     
-    logs = query.order_by(desc(Log.timestamp)).offset(offset).limit(limit).all()
-    return logs
+    try:
+        if cursor is None:
+            logs = (await db.scalars(query.order_by(*LOG_ORDER).offset(offset).limit(limit))).all()
+            return EncodedJSONResponse(model_dicts(logs, LogSchema))
+    except OperationalError:
+        raise HTTPException(status_code=400, detail="Invalid search query")
+    
+    if cursor:
+        try:
+            query = apply_cursor(query, cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    # Fetch one extra row to know whether another page exists
+    try:
+        logs = (await db.scalars(query.order_by(*LOG_ORDER).limit(limit + 1))).all()
+    except OperationalError:
+        raise HTTPException(status_code=400, detail="Invalid search query")
+    next_cursor = encode_cursor(logs[limit - 1]) if len(logs) > limit else None
+    return EncodedJSONResponse({"items": model_dicts(logs[:limit], LogSchema), "next_cursor": next_cursor})
 
 @api_router.delete("/logs")
-async def clear_logs(db: Session = Depends(get_db)):
+async def clear_logs(db: AsyncSession = Depends(get_async_db)):
     """Clear all logs"""
-    deleted_count = db.query(Log).count()
-    db.query(Log).delete()
-    db.commit()
+    deleted_count = await db.scalar(select(func.count()).select_from(Log))
+    await db.execute(delete(Log))
+    await db.commit()
     
     # Add a log entry about clearing logs
     log_entry = Log(
@@ -434,7 +680,7 @@ async def clear_logs(db: Session = Depends(get_db)):
         created_at=datetime.now(timezone.utc)
     )
     db.add(log_entry)
-    db.commit()
+    await db.commit()
     
     # Broadcast to websockets
     await websocket_manager.broadcast({
@@ -444,98 +690,143 @@ async def clear_logs(db: Session = Depends(get_db)):
     
     return {"message": f"Cleared {deleted_count} log entries"}
 
+@api_router.get("/logs/rollups", response_model=List[LogRollupSchema])
+async def get_log_rollups(
+    site_name: Optional[str] = Query(None, description="Filter by site name, empty for system logs"),
+    level: Optional[str] = Query(None, description="Filter by log level"),
+    since: Optional[datetime] = Query(None, description="First hour to include"),
+    until: Optional[datetime] = Query(None, description="Hours before this are included"),
+    limit: int = Query(1000, ge=1, le=10000, description="Number of rollups to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get hourly aggregates of log rows that retention has pruned, newest first"""
+    query = select(LogRollup)
+
+    if site_name is not None:
+        query = query.filter(LogRollup.site_name == site_name)
+
+    if level:
+        query = query.filter(LogRollup.level == level)
+
+    if since:
+        query = query.filter(LogRollup.hour >= since)
+
+    if until:
+        query = query.filter(LogRollup.hour < until)
+
+    return (await db.scalars(query.order_by(desc(LogRollup.hour), LogRollup.site_name, LogRollup.level).limit(limit))).all()
+
+@api_router.post("/logs/retention/run")
+async def run_log_retention():
+    """Apply the log retention TTLs now instead of waiting for the next scheduled run"""
+    result = await asyncio.to_thread(retention_job.run_once)
+    return {"message": "Retention run completed", **result}
+
 @api_router.get("/logs/export")
 async def export_logs(
     format: ExportFormat = Query(ExportFormat.json, description="Export format"),
     level: Optional[str] = Query(None, description="Filter by log level"),
     site_name: Optional[str] = Query(None, description="Filter by site name"),
-    db: Session = Depends(get_db)
+    gzip: bool = Query(False, description="Compress the response with gzip content-encoding")
 ):
-    """Export logs in different formats"""
-    query = db.query(Log)
-    
-    if level:
-        query = query.filter(Log.level == level)
-    
-    if site_name:
-        query = query.filter(Log.site_name == site_name)
+    """Export logs in different formats, streamed with constant memory"""
+    if format in COLUMNAR_FORMATS and pa is None:
+        raise HTTPException(status_code=501, detail="pyarrow is required for parquet and arrow exports")
     
-    logs = query.order_by(desc(Log.timestamp)).all()
+    rows = iter_log_rows(level, site_name)
     
     filename = f"autoclick-logs-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
     
+    if format in COLUMNAR_FORMATS:
+        # Already compressed column chunks, gzip is not applied
+        return StreamingResponse(
+            iter_columnar(rows, log_arrow_schema(), format.value),
+            media_type=COLUMNAR_FORMATS[format],
+            headers={"Content-Disposition": f"attachment; filename={filename}.{format.value}"}
+        )
+    
     if format == ExportFormat.json:
-        data = [
-            {
-                "id": log.id,
-                "timestamp": log.timestamp.isoformat(),
-                "level": log.level,
-                "action": log.action,
-                "site_name": log.site_name,
-                "message": log.message,
-                "duration": log.duration
-            }
-            for log in logs
-        ]
-        content = json.dumps(data, indent=2)
+        chunks = iter_json(rows)
         media_type = "application/json"
         filename += ".json"
     
+    elif format == ExportFormat.ndjson:
+        chunks = iter_ndjson(rows)
+        media_type = "application/x-ndjson"
+        filename += ".ndjson"
+    
     elif format == ExportFormat.csv:
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["ID", "Timestamp", "Level", "Action", "Site Name", "Message", "Duration"])
-        
-        for log in logs:
-            writer.writerow([
-                log.id,
-                log.timestamp.isoformat(),
-                log.level,
-                log.action,
-                log.site_name or "",
-                log.message,
-                log.duration or ""
-            ])
-        
-        content = output.getvalue()
+        chunks = iter_csv(rows)
         media_type = "text/csv"
         filename += ".csv"
     
     elif format == ExportFormat.txt:
-        lines = []
-        for log in logs:
-            site_info = f" - {log.site_name}" if log.site_name else ""
-            duration_info = f" ({log.duration}s)" if log.duration else ""
-            lines.append(
-                f"[{log.timestamp.isoformat()}] {log.level.upper()}{site_info}: {log.action} - {log.message}{duration_info}"
-            )
-        
-        content = "\n".join(lines)
+        chunks = iter_txt(rows)
         media_type = "text/plain"
         filename += ".txt"
     
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    
     return StreamingResponse(
-        io.BytesIO(content.encode()),
+        encode(chunks, gzip),
         media_type=media_type,
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+        headers=headers
     )
 
+@api_router.get("/metrics/visits/export")
+async def export_visit_metrics(
+    format: ExportFormat = Query(ExportFormat.parquet, description="Export format"),
+    site_id: Optional[str] = Query(None, description="Filter by site id")
+):
+    """Export per-visit navigation timing metrics"""
+    if format == ExportFormat.txt:
+        raise HTTPException(status_code=400, detail="Visit metrics cannot be exported as txt")
+    if format in COLUMNAR_FORMATS and pa is None:
+        raise HTTPException(status_code=501, detail="pyarrow is required for parquet and arrow exports")
+    
+    rows = iter_visit_metric_rows(site_id)
+    filename = f"autoclick-visit-metrics-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{format.value}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    
+    if format in COLUMNAR_FORMATS:
+        return StreamingResponse(
+            iter_columnar(rows, metric_arrow_schema(), format.value),
+            media_type=COLUMNAR_FORMATS[format],
+            headers=headers
+        )
+    
+    if format == ExportFormat.json:
+        chunks = iter_json(rows, metric_dict)
+        media_type = "application/json"
+    elif format == ExportFormat.ndjson:
+        chunks = iter_ndjson(rows, metric_dict)
+        media_type = "application/x-ndjson"
+    else:
+        chunks = iter_csv(rows, METRIC_CSV_HEADER, metric_csv_values)
+        media_type = "text/csv"
+    
+    return StreamingResponse(encode(chunks), media_type=media_type, headers=headers)
+
 # ============== SETTINGS ENDPOINTS ==============
 
 @api_router.get("/settings")
-async def get_settings(db: Session = Depends(get_db)):
+async def get_settings():
     """Get all system settings"""
-    settings = db.query(SystemSettings).all()
-    return {setting.key: setting.value for setting in settings}
+    return settings.all()
 
 @api_router.put("/settings/{key}")
 async def update_system_setting(
     key: str, 
     setting_update: SystemSettingUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a system setting"""
-    setting = update_setting(db, key, setting_update.value)
+    try:
+        await settings.update(db, key, setting_update.value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid value for setting '{key}': {e}")
     
     # Log the update
     log_entry = Log(
@@ -547,18 +838,18 @@ async def update_system_setting(
         created_at=datetime.now(timezone.utc)
     )
     db.add(log_entry)
-    db.commit()
+    await db.commit()
     
     return {"message": f"Setting '{key}' updated successfully", "value": setting_update.value}
 
 # ============== BULK OPERATIONS ==============
 
 @api_router.post("/sites/import")
-async def import_sites(bulk_import: BulkSiteImport, db: Session = Depends(get_db)):
+async def import_sites(bulk_import: BulkSiteImport, db: AsyncSession = Depends(get_async_db)):
     """Import multiple sites"""
     if bulk_import.replace_existing:
         # Delete all existing sites
-        db.query(Site).delete()
+        await db.execute(delete(Site))
     
     created_sites = []
     errors = []
@@ -567,11 +858,17 @@ async def import_sites(bulk_import: BulkSiteImport, db: Session = Depends(get_db
         try:
             # Check if URL already exists (if not replacing)
             if not bulk_import.replace_existing:
-                existing = db.query(Site).filter(Site.url == site_data.url).first()
+                existing = await db.scalar(select(Site).where(Site.url == site_data.url).limit(1))
                 if existing:
                     errors.append(f"Site with URL {site_data.url} already exists")
                     continue
             
+            try:
+                validate_site_timing(site_data.duration, site_data.interval)
+            except HTTPException as e:
+                errors.append(f"Site {site_data.name}: {e.detail}")
+                continue
+            
             db_site = Site(
                 id=str(uuid.uuid4()),
                 name=site_data.name,
@@ -590,7 +887,7 @@ async def import_sites(bulk_import: BulkSiteImport, db: Session = Depends(get_db
         except Exception as e:
             errors.append(f"Error creating site {site_data.name}: {str(e)}")
     
-    db.commit()
+    await db.commit()
     
     # Log the import
     log_entry = Log(
@@ -602,7 +899,12 @@ async def import_sites(bulk_import: BulkSiteImport, db: Session = Depends(get_db
         created_at=datetime.now(timezone.utc)
     )
     db.add(log_entry)
-    db.commit()
+    await db.commit()
+    
+    await event_bus.publish("sites.imported", {
+        "created_count": len(created_sites),
+        "replace_existing": bulk_import.replace_existing
+    })
     
     return {
         "message": f"Import completed",
@@ -612,9 +914,9 @@ async def import_sites(bulk_import: BulkSiteImport, db: Session = Depends(get_db
     }
 
 @api_router.get("/sites/export")
-async def export_sites(db: Session = Depends(get_db)):
+async def export_sites(db: AsyncSession = Depends(get_async_db)):
     """Export all sites configuration"""
-    sites = db.query(Site).all()
+    sites = (await db.scalars(select(Site))).all()
     
     data = [
         {
@@ -644,9 +946,43 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
         "engine_running": automation_engine.is_running,
-        "active_browsers": len(automation_engine.active_browsers)
+        "active_browsers": len(automation_engine.active_browsers),
+        "log_sink": automation_engine.log_sink.get_stats(),
+        "click_counter": automation_engine.click_counter.get_stats(),
+        "status_cache": automation_engine.status_cache.get_stats(),
+        "websocket": websocket_manager.get_stats(),
+        "browser_pool": automation_engine.browser_pool.get_stats(),
+        "scheduler": automation_engine.scheduler.get_stats(),
+        "retention": retention_job.get_stats(),
+        "backplane": backplane.get_stats(),
+        "engine_leader": engine_leader.get_stats() if backplane.is_distributed else None
     }
 
+@api_router.get("/cluster/nodes")
+async def get_cluster_nodes(db: AsyncSession = Depends(get_async_db)):
+    """Engine nodes with their last heartbeat and the number of sites they hold"""
+    site_counts = dict((await db.execute(
+        select(SiteLease.node_id, func.count()).group_by(SiteLease.node_id)
+    )).all())
+    workers = (await db.scalars(select(Worker).order_by(Worker.started_at))).all()
+    return [
+        {
+            "node_id": worker.node_id,
+            "hostname": worker.hostname,
+            "pid": worker.pid,
+            "capacity": worker.capacity,
+            "started_at": worker.started_at,
+            "heartbeat_at": worker.heartbeat_at,
+            "sites": site_counts.get(worker.node_id, 0)
+        }
+        for worker in workers
+    ]
+
+@api_router.get("/ws/clients")
+async def get_websocket_clients():
+    """Connected WebSocket clients with their outbound queue depth and send lag"""
+    return websocket_manager.get_connected_clients()
+
 @api_router.get("/")
 async def root():
     """Root endpoint"""
@@ -0,0 +1,138 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, SystemSettings, update_setting
+from event_bus import EventBus, event_bus
+
+logger = logging.getLogger(__name__)
+
+def parse_bool(value: str) -> bool:
+    if value.lower() in ("true", "1", "yes", "on"):
+        return True
+    if value.lower() in ("false", "0", "no", "off"):
+        return False
+    raise ValueError(f"Invalid boolean: {value}")
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise ValueError(f"Must be greater than 0: {value}")
+    return number
+
+def non_negative_float(value: str) -> float:
+    # 0 turns retention off
+    number = float(value)
+    if not number >= 0:
+        raise ValueError(f"Must be 0 or greater: {value}")
+    return number
+
+def fraction(value: str) -> float:
+    # Jitter of 1 or more could make the scheduler wait a negative delay
+    number = float(value)
+    if not 0 <= number < 1:
+        raise ValueError(f"Must be at least 0 and below 1: {value}")
+    return number
+
+# Parsers for known keys, anything else is kept as a string
+SETTING_TYPES: Dict[str, Callable[[str], Any]] = {
+    "global_interval": positive_int,
+    "schedule_jitter": fraction,
+    "max_sites": positive_int,
+    "is_paused": parse_bool,
+    "log_retention_info_days": non_negative_float,
+    "log_retention_success_days": non_negative_float,
+    "log_retention_warning_days": non_negative_float,
+    "log_retention_error_days": non_negative_float,
+    "visit_metric_retention_days": non_negative_float,
+}
+
+class SettingsCache:
+    """All system settings held in memory as typed values
+
+    Every key is loaded once and reads never touch the database. Writes go
+    through update(), which stores the value and publishes a setting.changed
+    event so running components can apply it.
+    """
+
+    def __init__(self, event_bus: Optional[EventBus] = None):
+        self.event_bus = event_bus
+        self._raw: Dict[str, str] = {}
+        self._values: Dict[str, Any] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        if event_bus:
+            # Changes made through another worker arrive as events
+            event_bus.subscribe("setting.changed", self.on_setting_changed)
+
+    def load(self, db: Session):
+        """(Re)load every setting from the database"""
+        rows = db.query(SystemSettings.key, SystemSettings.value).all()
+        raw = {key: value for key, value in rows}
+        values = {}
+        for key, value in raw.items():
+            try:
+                values[key] = self.parse(key, value)
+            except ValueError:
+                logger.warning(f"Invalid stored value for setting {key}: {value}")
+                values[key] = None
+        with self._lock:
+            self._raw = raw
+            self._values = values
+            self._loaded = True
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        db = SessionLocal()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    @staticmethod
+    def parse(key: str, value: str) -> Any:
+        """Convert a stored string to the key's type, raises ValueError if it does not fit"""
+        parser = SETTING_TYPES.get(key)
+        return parser(value) if parser else value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Typed value of a setting, default if it is unset or invalid"""
+        self._ensure_loaded()
+        with self._lock:
+            value = self._values.get(key)
+        return default if value is None else value
+
+    def all(self) -> Dict[str, str]:
+        """Every setting as its stored string"""
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._raw)
+
+    async def update(self, db: AsyncSession, key: str, value: str) -> Any:
+        """Validate, store and announce a new value, returns it typed"""
+        typed = self.parse(key, value)
+        self._ensure_loaded()
+        await db.run_sync(update_setting, key, value)
+
+        with self._lock:
+            previous = self._values.get(key)
+            self._raw[key] = value
+            self._values[key] = typed
+
+        if self.event_bus and typed != previous:
+            await self.event_bus.publish("setting.changed", {"key": key, "value": typed, "previous": previous, "raw": value})
+        return typed
+
+    async def on_setting_changed(self, topic: str, payload: dict):
+        if "raw" not in payload:
+            return
+        with self._lock:
+            self._raw[payload["key"]] = payload["raw"]
+            self._values[payload["key"]] = payload["value"]
+
+# Global settings cache instance
+settings = SettingsCache(event_bus)
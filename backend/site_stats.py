@@ -0,0 +1,158 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from database import VisitMetric
+
+# Width of one time slice and the windows reported per site, in seconds
+SLICE_SECONDS = 10
+WINDOWS = {"1m": 60, "15m": 15 * 60, "1h": 60 * 60}
+RETENTION_SECONDS = max(WINDOWS.values())
+
+# Log-scale histogram buckets, every value is reported within ~1% of its real value
+BUCKET_GROWTH = 1.02
+_LOG_GROWTH = math.log(BUCKET_GROWTH)
+
+def _bucket(value_ms: float) -> int:
+    return int(math.log(max(value_ms, 1.0)) / _LOG_GROWTH)
+
+def _bucket_value(bucket: int) -> float:
+    # Midpoint of the bucket range
+    return BUCKET_GROWTH ** (bucket + 0.5)
+
+def _epoch(timestamp: datetime) -> float:
+    # Naive timestamps come from the database and are stored in UTC
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+class _Slice:
+    """Visit counts and load time histogram for one SLICE_SECONDS interval"""
+    __slots__ = ("index", "visits", "errors", "total_ms", "buckets")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.visits = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.buckets: Dict[int, int] = defaultdict(int)
+
+class SiteStatsAggregator:
+    """Streaming per-site latency percentiles, error rate and throughput over rolling windows"""
+
+    def __init__(self):
+        self._slices: Dict[str, Deque[_Slice]] = defaultdict(deque)
+        self._lock = threading.Lock()
+        # Monotonic time of the last rebuild from visit metrics
+        self.rebuilt_at = 0.0
+
+    def record(self, site_id: str, timestamp: datetime, success: bool, load_time_ms: Optional[int]):
+        """Add one visit, called from the engine for every visit"""
+        index = int(_epoch(timestamp) // SLICE_SECONDS)
+        with self._lock:
+            slices = self._slices[site_id]
+            current = self._slice_for(slices, index)
+            if current is None:
+                return
+            current.visits += 1
+            if not success:
+                current.errors += 1
+            elif load_time_ms is not None:
+                current.total_ms += load_time_ms
+                current.buckets[_bucket(load_time_ms)] += 1
+            self._expire(slices, index)
+
+    def _slice_for(self, slices: Deque[_Slice], index: int) -> Optional[_Slice]:
+        """Find or insert the slice for index, keeping the deque ordered"""
+        if not slices or slices[-1].index < index:
+            slices.append(_Slice(index))
+            return slices[-1]
+        for position in range(len(slices) - 1, -1, -1):
+            if slices[position].index == index:
+                return slices[position]
+            if slices[position].index < index:
+                slices.insert(position + 1, _Slice(index))
+                return slices[position + 1]
+        if index > slices[-1].index - RETENTION_SECONDS // SLICE_SECONDS:
+            slices.appendleft(_Slice(index))
+            return slices[0]
+        # Older than the longest window
+        return None
+
+    def _expire(self, slices: Deque[_Slice], now_index: int):
+        oldest = now_index - RETENTION_SECONDS // SLICE_SECONDS
+        while slices and slices[0].index <= oldest:
+            slices.popleft()
+
+    def remove(self, site_id: str):
+        with self._lock:
+            self._slices.pop(site_id, None)
+
+    def get_stats(self, site_id: str, now: float = None) -> Dict[str, dict]:
+        """Aggregate every window for a site"""
+        now_index = int((now or time.time()) // SLICE_SECONDS)
+        with self._lock:
+            slices = list(self._slices.get(site_id, ()))
+        return {
+            name: self._aggregate([s for s in slices if s.index > now_index - seconds // SLICE_SECONDS], seconds)
+            for name, seconds in WINDOWS.items()
+        }
+
+    @staticmethod
+    def _aggregate(slices: List[_Slice], seconds: int) -> dict:
+        visits = sum(s.visits for s in slices)
+        errors = sum(s.errors for s in slices)
+        buckets: Dict[int, int] = defaultdict(int)
+        total_ms = 0.0
+        for s in slices:
+            total_ms += s.total_ms
+            for bucket, count in s.buckets.items():
+                buckets[bucket] += count
+
+        samples = sum(buckets.values())
+        percentiles = {50: None, 95: None, 99: None}
+        if samples:
+            ordered = sorted(buckets.items())
+            for percentile in percentiles:
+                rank = math.ceil(samples * percentile / 100)
+                seen = 0
+                for bucket, count in ordered:
+                    seen += count
+                    if seen >= rank:
+                        percentiles[percentile] = round(_bucket_value(bucket))
+                        break
+
+        return {
+            "visits": visits,
+            "errors": errors,
+            "error_rate": round(errors / visits, 4) if visits else 0.0,
+            "throughput_per_min": round(visits / (seconds / 60), 3),
+            "mean_load_time_ms": round(total_ms / samples) if samples else None,
+            "p50_load_time_ms": percentiles[50],
+            "p95_load_time_ms": percentiles[95],
+            "p99_load_time_ms": percentiles[99],
+        }
+
+    def rebuild(self, db: Session):
+        """Reload the longest window from persisted visit metrics"""
+        since = datetime.now(timezone.utc) - timedelta(seconds=RETENTION_SECONDS)
+        rows = (
+            db.query(VisitMetric.site_id, VisitMetric.timestamp, VisitMetric.success, VisitMetric.load_time_ms)
+            .filter(VisitMetric.timestamp >= since)
+            .order_by(VisitMetric.timestamp)
+            .all()
+        )
+
+        # Readers keep seeing the previous statistics until the new ones are complete
+        rebuilt = SiteStatsAggregator()
+        for site_id, timestamp, success, load_time_ms in rows:
+            rebuilt.record(site_id, timestamp, success, load_time_ms)
+        with self._lock:
+            self._slices = rebuilt._slices
+            self.rebuilt_at = time.monotonic()
+        return len(rows)
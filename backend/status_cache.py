@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import case, func, select
+
+from click_counter import ClickCounter
+from database import SessionLocal, Site
+from loop_bridge import LoopBridge
+from settings_cache import settings
+
+logger = logging.getLogger(__name__)
+
+class StatusCache:
+    """Site counts and total clicks for /api/status, served from memory
+
+    Site events adjust the snapshot in place. Events that cannot be applied
+    incrementally mark it stale, and a stale or older than ttl snapshot is
+    recomputed with one aggregate query. Changes are announced through
+    on_change at most once per push_delay.
+    """
+
+    def __init__(
+        self,
+        click_counter: ClickCounter,
+        loop_bridge: LoopBridge,
+        on_change: Optional[Callable[[], Awaitable]] = None,
+        ttl: float = 5.0,
+        push_delay: float = 0.5,
+    ):
+        self.click_counter = click_counter
+        self.loop_bridge = loop_bridge
+        self.on_change = on_change
+        self.ttl = ttl
+        self.push_delay = push_delay
+
+        self.total_sites = 0
+        self.active_sites = 0
+        self.global_interval = 10
+        # Clicks in the database at the last refresh plus visits not flushed then
+        self._base_clicks = 0
+        # click_counter.recorded_count at the last refresh
+        self._base_recorded = 0
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        # Bumped by every event, a refresh that raced with one stays stale
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._push_handle: Optional[asyncio.TimerHandle] = None
+
+        self.hits = 0
+        self.refreshes = 0
+
+    def refresh(self):
+        """Recompute the snapshot from the database, blocking"""
+        with self._refresh_lock:
+            if not self._needs_refresh():
+                return
+            with self._lock:
+                generation = self._generation
+
+            # No flush may land between the SUM and reading what is still pending
+            with self.click_counter.settled():
+                db = SessionLocal()
+                try:
+                    total_sites, active_sites, clicks = db.execute(
+                        select(
+                            func.count(Site.id),
+                            func.coalesce(func.sum(case((Site.is_active == True, 1), else_=0)), 0),
+                            func.coalesce(func.sum(Site.clicks), 0),
+                        )
+                    ).one()
+                finally:
+                    db.close()
+                recorded, pending = self.click_counter.totals()
+
+            with self._lock:
+                self.total_sites = total_sites
+                self.active_sites = active_sites
+                self.global_interval = settings.get("global_interval", 10)
+                self._base_clicks = clicks + pending
+                self._base_recorded = recorded
+                self._loaded_at = time.monotonic()
+                self._stale = self._generation != generation
+                self.refreshes += 1
+
+    def _needs_refresh(self) -> bool:
+        with self._lock:
+            return self._stale or self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def get(self) -> dict:
+        """Current snapshot, refreshed off the event loop when stale"""
+        if self._needs_refresh():
+            await asyncio.to_thread(self.refresh)
+        else:
+            with self._lock:
+                self.hits += 1
+        return self.snapshot()
+
+    def snapshot(self) -> dict:
+        """Snapshot as of the last refresh and the events since, never queries"""
+        recorded, _ = self.click_counter.totals()
+        with self._lock:
+            return {
+                "active_sites_count": self.active_sites,
+                "total_sites_count": self.total_sites,
+                "total_clicks": self._base_clicks + recorded - self._base_recorded,
+                "global_interval": self.global_interval,
+            }
+
+    def invalidate(self):
+        """Force a refresh on the next read"""
+        with self._lock:
+            self._stale = True
+            self._generation += 1
+        self.changed()
+
+    async def on_site_event(self, topic: str, payload: dict):
+        """Apply site CRUD events to the counts"""
+        with self._lock:
+            self._generation += 1
+            if topic == "site.created":
+                self.total_sites += 1
+                self.active_sites += 1 if payload.get("is_active") else 0
+            elif topic == "site.toggled":
+                self.active_sites += 1 if payload.get("is_active") else -1
+            else:
+                # Updates, deletions and imports do not say what changed
+                self._stale = True
+        self.changed()
+
+    async def on_setting_changed(self, topic: str, payload: dict):
+        if payload["key"] == "global_interval":
+            with self._lock:
+                self.global_interval = payload["value"]
+            self.changed()
+
+    def changed(self):
+        """Announce a change from any thread, coalescing bursts into one push"""
+        if self.on_change:
+            self.loop_bridge.call_soon(self._schedule_push)
+
+    def _schedule_push(self):
+        if self._push_handle is not None:
+            return
+        self._push_handle = self.loop_bridge.loop.call_later(self.push_delay, self._push)
+
+    def _push(self):
+        self._push_handle = None
+        self.loop_bridge.submit(self.on_change())
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "refreshes": self.refreshes,
+                "age_seconds": round(time.monotonic() - self._loaded_at, 3) if self._loaded_at else None,
+                "stale": self._stale,
+            }
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Test script to verify engine node failover and rebalancing - local multi-process version
+
+Starts engine nodes as separate processes on a scratch SQLite database, then
+adds a node, kills one and stops another, checking after each step that every
+active site is leased by exactly one live node.
+
+Usage: python test_cluster.py [--sites 30] [--database-url sqlite:////tmp/autoclick_cluster.db]
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(__file__))
+
+HEARTBEAT = 1.0
+LEASE_TTL = 3.0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sites", type=int, default=30)
+    parser.add_argument("--database-url", default="sqlite:////tmp/autoclick_cluster.db",
+                        help="coordinator database, SQLite or Postgres")
+    return parser.parse_args()
+
+args = parse_args() if __name__ == "__main__" else None
+if args:
+    # database.py reads DATABASE_URL on import
+    os.environ["DATABASE_URL"] = args.database_url
+
+from sqlalchemy import delete, func, insert, select
+
+from database import SessionLocal, Site, SiteLease, SystemSettings, Worker, create_tables, init_system_settings
+
+def prepare(sites: int):
+    if args.database_url.startswith("sqlite:///"):
+        path = args.database_url[len("sqlite:///"):]
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    create_tables()
+    db = SessionLocal()
+    try:
+        init_system_settings(db)
+        for model in (SiteLease, Worker, Site):
+            db.execute(delete(model))
+        # Nodes only take leases here, no browser is started
+        db.query(SystemSettings).filter(SystemSettings.key == "system_status").update({"value": "stopped"})
+        db.execute(insert(Site), [
+            {"id": f"site-{i}", "name": f"site-{i}", "url": f"https://example.com/{i}", "is_active": True, "clicks": 0}
+            for i in range(sites)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+def start_node() -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=args.database_url, BACKPLANE_URL="")
+    return subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(__file__), "engine_node.py"),
+         "--heartbeat", str(HEARTBEAT), "--lease-ttl", str(LEASE_TTL)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+def leases_by_pid() -> dict:
+    """Live leases per node process id"""
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(Worker.pid, func.count(SiteLease.site_id))
+            .join(SiteLease, SiteLease.node_id == Worker.node_id)
+            .where(SiteLease.expires_at >= datetime.now(timezone.utc))
+            .group_by(Worker.pid)
+        ).all()
+        return {pid: count for pid, count in rows}
+    finally:
+        db.close()
+
+def wait_for(nodes: list, sites: int, timeout: float) -> dict:
+    """Wait until exactly the given nodes hold leases and every site is leased"""
+    pids = {node.pid for node in nodes}
+    deadline = time.monotonic() + timeout
+    counts = {}
+    while time.monotonic() < deadline:
+        counts = leases_by_pid()
+        if set(counts) == pids and sum(counts.values()) == sites:
+            return counts
+        time.sleep(0.5)
+    raise AssertionError(f"Sites did not settle on nodes {sorted(pids)}: {counts}")
+
+def check_failover() -> bool:
+    nodes = []
+    try:
+        print(f"Preparing {args.sites} active sites in {args.database_url}...")
+        prepare(args.sites)
+
+        print("Starting 2 engine nodes...")
+        nodes += [start_node(), start_node()]
+        counts = wait_for(nodes, args.sites, timeout=15)
+        print(f"✅ Sites split across 2 nodes: {sorted(counts.values())}")
+
+        print("Starting a 3rd node...")
+        nodes.append(start_node())
+        counts = wait_for(nodes, args.sites, timeout=15)
+        print(f"✅ Rebalanced across 3 nodes: {sorted(counts.values())}")
+
+        victim = nodes.pop(0)
+        print(f"Killing node {victim.pid} without a chance to clean up...")
+        victim.send_signal(signal.SIGKILL)
+        started = time.monotonic()
+        counts = wait_for(nodes, args.sites, timeout=LEASE_TTL * 3 + 10)
+        print(f"✅ Its sites were taken over in {time.monotonic() - started:.1f}s: {sorted(counts.values())}")
+
+        leaving = nodes.pop(0)
+        print(f"Stopping node {leaving.pid} gracefully...")
+        leaving.send_signal(signal.SIGTERM)
+        started = time.monotonic()
+        counts = wait_for(nodes, args.sites, timeout=15)
+        print(f"✅ Its sites were handed over in {time.monotonic() - started:.1f}s: {sorted(counts.values())}")
+        leaving.wait(timeout=10)
+
+    except AssertionError as e:
+        print(f"❌ {e}")
+        return False
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return False
+    finally:
+        for node in nodes:
+            node.send_signal(signal.SIGTERM)
+        for node in nodes:
+            try:
+                node.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                node.kill()
+
+    return True
+
+if __name__ == "__main__":
+    if check_failover():
+        print("🎉 Engine nodes fail over and rebalance!")
+        sys.exit(0)
+    else:
+        print("❌ Engine node failover test failed!")
+        sys.exit(1)
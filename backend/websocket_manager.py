@@ -1,88 +1,418 @@
-import json
 import asyncio
-from typing import List, Dict, Any
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Iterable, List, Dict, Any, Optional, Set, Tuple, Union
 from fastapi import WebSocket, WebSocketDisconnect
 import logging
 from datetime import datetime
 
+from encoders import ENCODERS, SUBPROTOCOLS, Encoder, json_encoder, negotiate_subprotocol
+
 logger = logging.getLogger(__name__)
 
+# What to do when a client's outbound queue is full
+SLOW_CLIENT_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Message types where only the newest queued one matters
+COALESCED_TYPES = {"status", "ping", "pong"}
+
+# Matches every message type, or every site
+WILDCARD = "*"
+
+# Keepalives reach every client whatever it subscribed to
+UNFILTERED_TYPES = {"ping"}
+
+# (message type, site name), either part may be the wildcard
+Topic = Tuple[str, str]
+
+def parse_channel(channel: str) -> Topic:
+    """Turn "log", "log:Site A" or "*:Site A" into a topic"""
+    message_type, _, site = str(channel).partition(":")
+    return (message_type.strip() or WILDCARD, site.strip() or WILDCARD)
+
+# Message types broadcast to clients that can be subscribed to
+MESSAGE_TYPES = {"log", "logs_cleared", "status", "site_created", "site_updated", "site_deleted", "site_toggled"}
+
+# Channel names used by older clients, each standing for several message types
+CHANNEL_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "logs": ("log", "logs_cleared"),
+    "sites": ("site_created", "site_updated", "site_deleted", "site_toggled"),
+}
+
+def parse_channels(channels: List[str]) -> Tuple[Set[Topic], List[str]]:
+    """Topics for a list of channels, and the channels naming no known message type"""
+    topics: Set[Topic] = set()
+    unknown: List[str] = []
+    for channel in channels:
+        message_type, site = parse_channel(channel)
+        if message_type in CHANNEL_ALIASES:
+            topics.update((alias, site) for alias in CHANNEL_ALIASES[message_type])
+        elif message_type == WILDCARD or message_type in MESSAGE_TYPES:
+            topics.add((message_type, site))
+        else:
+            unknown.append(str(channel))
+    return topics, unknown
+
+def format_channel(topic: Topic) -> str:
+    message_type, site = topic
+    return message_type if site == WILDCARD else f"{message_type}:{site}"
+
+def message_site(message: dict) -> Optional[str]:
+    """Name of the site a broadcast is about, if any"""
+    data = message.get("data")
+    if not isinstance(data, dict):
+        return None
+    site = data.get("site")
+    if isinstance(site, dict) and site.get("name"):
+        return site["name"]
+    return data.get("site_name")
+
+class ClientConnection:
+    """Bounded outbound queue of one websocket client, drained by its own writer task
+
+    With a batch window the writer waits that long after the first queued
+    message and sends everything queued meanwhile as one batch frame.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        client_id: str,
+        on_close: Callable[["ClientConnection"], None],
+        max_queue_size: int = 1000,
+        policy: str = "drop_oldest",
+        send_timeout: float = 10.0,
+        batch_window: float = 0.0,
+        encoder: Encoder = json_encoder,
+    ):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.on_close = on_close
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.batch_window = batch_window
+        self.encoder = encoder
+        self.connected_at = datetime.utcnow()
+        self.last_ping = datetime.utcnow()
+
+        # (enqueued at, message type, encoded message)
+        self.queue: Deque[Tuple[float, str, Union[str, bytes]]] = deque()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.too_slow = False
+        # Topics this client receives broadcasts for, everything until it subscribes
+        self.subscriptions: Set[Topic] = {(WILDCARD, WILDCARD)}
+
+        self.sent_count = 0
+        self.frame_count = 0
+        self.dropped_count = 0
+        self.coalesced_count = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._write(), name=f"ws-writer-{self.client_id}")
+
+    def stop(self):
+        self.closed = True
+        self.queue.clear()
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    def enqueue(self, message_type: str, data: Union[str, bytes]) -> bool:
+        """Queue an encoded message without waiting, applying the slow client policy when full"""
+        if self.closed:
+            return False
+
+        # A batch only needs the newest status, whatever the policy
+        if message_type in COALESCED_TYPES and (self.policy == "coalesce" or self.batch_window):
+            self._remove_type(message_type)
+
+        if len(self.queue) >= self.max_queue_size:
+            if self.policy == "disconnect":
+                logger.warning(f"Disconnecting slow WebSocket client {self.client_id} with {len(self.queue)} queued messages")
+                self.too_slow = True
+                self.close(code=1008, reason="Client too slow")
+                return False
+            if self.policy == "coalesce":
+                for coalesced_type in COALESCED_TYPES:
+                    self._remove_type(coalesced_type)
+            if len(self.queue) >= self.max_queue_size:
+                self.queue.popleft()
+                self.dropped_count += 1
+
+        self.queue.append((time.monotonic(), message_type, data))
+        self._ready.set()
+        return True
+
+    def _remove_type(self, message_type: str):
+        """Drop queued messages of a type that a newer one supersedes"""
+        kept = deque(entry for entry in self.queue if entry[1] != message_type)
+        self.coalesced_count += len(self.queue) - len(kept)
+        self.queue = kept
+
+    def close(self, code: int = 1000, reason: str = ""):
+        """Stop sending and close the socket in the background"""
+        if self.closed:
+            return
+        self.on_close(self)
+        asyncio.create_task(self._close_socket(code, reason))
+
+    async def _close_socket(self, code: int, reason: str):
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    async def _write(self):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+
+                if self.batch_window:
+                    await asyncio.sleep(self.batch_window)
+                    entries = list(self.queue)
+                    self.queue.clear()
+                    if not entries:
+                        continue
+                else:
+                    entries = [self.queue.popleft()]
+
+                if len(entries) == 1:
+                    data = entries[0][2]
+                else:
+                    data = self.encoder.batch([entry[2] for entry in entries])
+                send = self.websocket.send_bytes if self.encoder.binary else self.websocket.send_text
+                await asyncio.wait_for(send(data), timeout=self.send_timeout)
+
+                lag = time.monotonic() - entries[0][0]
+                self.sent_count += len(entries)
+                self.frame_count += 1
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Send to WebSocket client {self.client_id} stalled for {self.send_timeout}s")
+            self.close(code=1011)
+        except Exception as e:
+            logger.error(f"Error sending to WebSocket client {self.client_id}: {e}")
+            self.close(code=1011)
+
+    def get_stats(self) -> dict:
+        return {
+            "client_id": self.client_id,
+            "connected_at": self.connected_at.isoformat(),
+            "last_ping": self.last_ping.isoformat(),
+            "subscriptions": sorted(format_channel(topic) for topic in self.subscriptions),
+            "queue_depth": len(self.queue),
+            "max_queue_size": self.max_queue_size,
+            "encoder": self.encoder.name,
+            "batch_window_ms": round(self.batch_window * 1000),
+            "sent": self.sent_count,
+            "frames": self.frame_count,
+            "dropped": self.dropped_count,
+            "coalesced": self.coalesced_count,
+            "oldest_queued_ms": round((time.monotonic() - self.queue[0][0]) * 1000, 1) if self.queue else 0.0,
+            "last_lag_ms": round(self.last_lag * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+        }
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.connection_info: Dict[WebSocket, Dict[str, Any]] = {}
+    """Websocket clients and the index of which ones each broadcast topic reaches"""
+
+    def __init__(
+        self,
+        max_queue_size: int = 1000,
+        policy: str = "drop_oldest",
+        send_timeout: float = 10.0,
+        batch_window: float = 0.1,
+    ):
+        if policy not in SLOW_CLIENT_POLICIES:
+            raise ValueError(f"Unknown slow client policy: {policy}")
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.batch_window = batch_window
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.topics: Dict[Topic, Set[ClientConnection]] = {}
+        # Relays broadcasts to clients of the other worker processes, if there are any
+        self.backplane = None
+        self.disconnected_slow_count = 0
+        self.skipped_count = 0
     
-    async def connect(self, websocket: WebSocket, client_id: str = None):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        self.connection_info[websocket] = {
-            "client_id": client_id or f"client_{len(self.active_connections)}",
-            "connected_at": datetime.utcnow(),
-            "last_ping": datetime.utcnow()
-        }
-        logger.info(f"WebSocket client connected: {self.connection_info[websocket]['client_id']}")
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+    
+    async def connect(
+        self,
+        websocket: WebSocket,
+        client_id: str = None,
+        channels: Optional[List[str]] = None,
+        batch: bool = False,
+    ):
+        # Clients may ask for msgpack binary frames with the "msgpack" subprotocol
+        subprotocol = negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=subprotocol)
+        client = ClientConnection(
+            websocket,
+            client_id or f"client_{len(self.clients) + 1}",
+            self._on_client_closed,
+            max_queue_size=self.max_queue_size,
+            policy=self.policy,
+            send_timeout=self.send_timeout,
+            batch_window=self.batch_window if batch else 0.0,
+            encoder=ENCODERS[SUBPROTOCOLS[subprotocol]] if subprotocol else json_encoder
+        )
+        self.clients[websocket] = client
+        self._index(client, client.subscriptions)
+        if channels:
+            _, rejected = self.subscribe(websocket, channels)
+            if rejected:
+                logger.warning(f"Client {client.client_id} asked for unknown channels: {rejected}")
+        client.start()
+        logger.info(f"WebSocket client connected: {client.client_id} ({client.encoder.name}{', batched' if batch else ''})")
         
         # Send welcome message
         await self.send_personal_message({
             "type": "connected",
             "data": {
                 "message": "Connected to AutoClick System",
-                "client_id": self.connection_info[websocket]["client_id"]
+                "client_id": client.client_id
             },
             "timestamp": datetime.utcnow().isoformat()
         }, websocket)
     
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            client_id = self.connection_info.get(websocket, {}).get("client_id", "unknown")
-            self.active_connections.remove(websocket)
-            if websocket in self.connection_info:
-                del self.connection_info[websocket]
-            logger.info(f"WebSocket client disconnected: {client_id}")
+        client = self.clients.pop(websocket, None)
+        if client:
+            self._unindex(client, client.subscriptions)
+            client.stop()
+            logger.info(f"WebSocket client disconnected: {client.client_id}")
+    
+    def _index(self, client: ClientConnection, topics: Iterable[Topic]):
+        for topic in topics:
+            self.topics.setdefault(topic, set()).add(client)
+
+    def _unindex(self, client: ClientConnection, topics: Iterable[Topic]):
+        for topic in topics:
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.topics[topic]
+
+    def subscribe(self, websocket: WebSocket, channels: List[str]) -> Tuple[List[str], List[str]]:
+        """Add channels to a client, the first call replaces the default of everything
+
+        Returns the client's channels and the requested ones that were rejected
+        as unknown.
+        """
+        client = self.clients.get(websocket)
+        if not client:
+            return [], []
+        topics, unknown = parse_channels(channels)
+        if not topics:
+            return sorted(format_channel(topic) for topic in client.subscriptions), unknown
+        if client.subscriptions == {(WILDCARD, WILDCARD)}:
+            self._unindex(client, client.subscriptions)
+            client.subscriptions = set()
+        self._index(client, topics - client.subscriptions)
+        client.subscriptions |= topics
+        return sorted(format_channel(topic) for topic in client.subscriptions), unknown
+
+    def unsubscribe(self, websocket: WebSocket, channels: List[str]) -> Tuple[List[str], List[str]]:
+        """Remove channels from a client, with none left it only gets keepalives"""
+        client = self.clients.get(websocket)
+        if not client:
+            return [], []
+        topics, unknown = parse_channels(channels)
+        topics &= client.subscriptions
+        self._unindex(client, topics)
+        client.subscriptions -= topics
+        return sorted(format_channel(topic) for topic in client.subscriptions), unknown
+
+    def subscribers(self, message_type: str, site: Optional[str] = None) -> Set[ClientConnection]:
+        """Clients subscribed to a message type about a site"""
+        if message_type in UNFILTERED_TYPES:
+            return set(self.clients.values())
+        sites = (WILDCARD, site) if site else (WILDCARD,)
+        clients: Set[ClientConnection] = set()
+        for type_key in (message_type, WILDCARD):
+            for site_key in sites:
+                clients |= self.topics.get((type_key, site_key), set())
+        return clients
+
+    def _on_client_closed(self, client: ClientConnection):
+        if client.too_slow:
+            self.disconnected_slow_count += 1
+        self.disconnect(client.websocket)
     
     async def send_personal_message(self, message: dict, websocket: WebSocket):
-        try:
-            if websocket in self.active_connections:
-                await websocket.send_text(json.dumps(message, default=str))
-        except Exception as e:
-            logger.error(f"Error sending personal message: {e}")
-            self.disconnect(websocket)
+        client = self.clients.get(websocket)
+        if client:
+            client.enqueue(message.get("type", ""), client.encoder.encode(message))
     
-    async def broadcast(self, message: dict):
-        """Broadcast message to all connected clients"""
-        if not self.active_connections:
+    async def broadcast(self, message: dict, local: bool = False):
+        """Send a message to subscribed clients of every worker, or only this one's with local"""
+        message["timestamp"] = datetime.utcnow().isoformat()
+        await self.deliver(message)
+        if self.backplane and not local:
+            await self.backplane.publish("ws", message)
+    
+    async def deliver(self, message: dict):
+        """Queue a message for this worker's clients subscribed to its topic, encoded once per encoder and without waiting on sends"""
+        if not self.clients:
             return
         
-        message["timestamp"] = datetime.utcnow().isoformat()
-        message_str = json.dumps(message, default=str)
+        message_type = message.get("type", "")
+        clients = self.subscribers(message_type, message_site(message))
+        self.skipped_count += len(self.clients) - len(clients)
+        if not clients:
+            return
         
-        # Create a copy of connections to avoid modification during iteration
-        connections_copy = self.active_connections.copy()
+        encoded: Dict[str, Union[str, bytes]] = {}
         
-        for connection in connections_copy:
-            try:
-                await connection.send_text(message_str)
-            except Exception as e:
-                logger.error(f"Error broadcasting to client: {e}")
-                self.disconnect(connection)
+        for client in clients:
+            data = encoded.get(client.encoder.name)
+            if data is None:
+                data = encoded[client.encoder.name] = client.encoder.encode(message)
+            client.enqueue(message_type, data)
     
     async def send_to_client(self, client_id: str, message: dict):
         """Send message to specific client"""
-        for websocket, info in self.connection_info.items():
-            if info["client_id"] == client_id:
+        for websocket, client in self.clients.items():
+            if client.client_id == client_id:
                 await self.send_personal_message(message, websocket)
                 break
     
     def get_connected_clients(self) -> List[Dict[str, Any]]:
-        """Get information about all connected clients"""
-        return [
-            {
-                "client_id": info["client_id"],
-                "connected_at": info["connected_at"].isoformat(),
-                "last_ping": info["last_ping"].isoformat()
-            }
-            for info in self.connection_info.values()
-        ]
+        """Get information about all connected clients, with their queue depth and send lag"""
+        return [client.get_stats() for client in self.clients.values()]
+    
+    def get_stats(self) -> dict:
+        clients = list(self.clients.values())
+        return {
+            "clients": len(clients),
+            "topics": {format_channel(topic): len(subscribers) for topic, subscribers in self.topics.items()},
+            "skipped": self.skipped_count,
+            "policy": self.policy,
+            "batched_clients": sum(1 for client in clients if client.batch_window),
+            "queued": sum(len(client.queue) for client in clients),
+            "dropped": sum(client.dropped_count for client in clients),
+            "coalesced": sum(client.coalesced_count for client in clients),
+            "sent": sum(client.sent_count for client in clients),
+            "frames": sum(client.frame_count for client in clients),
+            "max_lag_ms": round(max((client.max_lag for client in clients), default=0.0) * 1000, 1),
+            "disconnected_slow": self.disconnected_slow_count,
+        }
     
     async def ping_all_clients(self):
         """Send ping to all clients to keep connections alive"""
@@ -90,19 +420,20 @@ class ConnectionManager:
             "type": "ping",
             "data": {"timestamp": datetime.utcnow().isoformat()}
         }
-        await self.broadcast(ping_message)
+        await self.broadcast(ping_message, local=True)
     
-    async def handle_client_message(self, websocket: WebSocket, message: str):
+    async def handle_client_message(self, websocket: WebSocket, message: Union[str, bytes]):
         """Handle incoming messages from clients"""
         try:
-            data = json.loads(message)
+            client = self.clients.get(websocket)
+            client_id = client.client_id if client else None
+            data = (client.encoder if client else json_encoder).loads(message)
             message_type = data.get("type")
-            client_id = self.connection_info.get(websocket, {}).get("client_id")
             
             if message_type == "pong":
                 # Update last ping time
-                if websocket in self.connection_info:
-                    self.connection_info[websocket]["last_ping"] = datetime.utcnow()
+                if client:
+                    client.last_ping = datetime.utcnow()
             
             elif message_type == "ping":
                 # Respond with pong
@@ -112,21 +443,40 @@ class ConnectionManager:
                 }, websocket)
             
             elif message_type == "subscribe":
-                # Handle subscription to specific events
+                # Channels are "<type>" or "<type>:<site name>", "*" matches any
                 channels = data.get("data", {}).get("channels", [])
+                subscribed, rejected = self.subscribe(websocket, channels)
                 logger.info(f"Client {client_id} subscribed to channels: {channels}")
+                if rejected:
+                    logger.warning(f"Client {client_id} asked for unknown channels: {rejected}")
+                await self.send_personal_message({
+                    "type": "subscribed",
+                    "data": {"channels": subscribed, "rejected": rejected}
+                }, websocket)
+            
+            elif message_type == "unsubscribe":
+                channels = data.get("data", {}).get("channels", [])
+                subscribed, rejected = self.unsubscribe(websocket, channels)
+                logger.info(f"Client {client_id} unsubscribed from channels: {channels}")
+                if rejected:
+                    logger.warning(f"Client {client_id} asked for unknown channels: {rejected}")
                 await self.send_personal_message({
                     "type": "subscribed",
-                    "data": {"channels": channels}
+                    "data": {"channels": subscribed, "rejected": rejected}
                 }, websocket)
             
             else:
                 logger.warning(f"Unknown message type from client {client_id}: {message_type}")
                 
-        except json.JSONDecodeError:
-            logger.error(f"Invalid JSON received from client")
+        except ValueError:
+            logger.error(f"Invalid message received from client")
         except Exception as e:
             logger.error(f"Error handling client message: {e}")
 
 # Global connection manager instance
-manager = ConnectionManager()
+manager = ConnectionManager(
+    max_queue_size=int(os.environ.get('WS_CLIENT_QUEUE_SIZE', '1000')),
+    policy=os.environ.get('WS_SLOW_CLIENT_POLICY', 'drop_oldest'),
+    send_timeout=float(os.environ.get('WS_SEND_TIMEOUT', '10')),
+    batch_window=float(os.environ.get('WS_BATCH_WINDOW_MS', '100')) / 1000
+)